@@ -1,3 +1,4 @@
+import json
 import logging
 import os
 import sys
@@ -23,9 +24,48 @@ SOURCE_NAME = "SOURCE_NAME"
 STORAGE_CLASS = "STORAGE_CLASS"
 
 csa_str = "csa"
+csa_pointer_dir_name = "latest"
+csa_pointer_key_str = "key"
 yesterday_str = "yesterday"
 
 
+# Get the S3 object key of the latest CSA file (of a date prefix path), by listing all the CSA files (of the date).
+def get_csa_listed(s3, bucket_name: str, prefix_path: str) -> str:
+    csa_files = set()
+    is_truncated = True
+    next_continuation_token = None
+    while is_truncated:
+        s3_res = s3_list_objects(s3, bucket_name, prefix_path, continuation_token=next_continuation_token)
+        is_truncated = s3_res["IsTruncated"]
+        if "Contents" in s3_res:
+            csa_files = csa_files.union({i["Key"].rsplit(sep="/", maxsplit=1)[-1] for i in s3_res["Contents"]})
+        if is_truncated and "NextContinuationToken" in s3_res:
+            next_continuation_token = s3_res["NextContinuationToken"]
+    return f"{prefix_path}/{csa_files_list[0]}" if (csa_files_list := sorted(list(csa_files), reverse=True)) else None
+
+
+# Get the S3 object key of the latest CSA file (of a date) from the latest CSA pointer object (of the date), with a
+# single GET, or None if there is no latest CSA pointer object (of the date).
+def get_csa_pointer(s3, bucket_name: str, source_name: str, date: str) -> str:
+    pointer_key = get_csa_pointer_key(source_name, date)
+    try:
+        s3_res = s3.get_object(Bucket=bucket_name, Key=pointer_key, ExpectedBucketOwner=os.environ[ACCOUNT_OWNER_ID])
+    except ClientError as ex:
+        if ex.response["Error"]["Code"] not in {"NoSuchKey", "404"}:
+            logger.error(f"## ERROR: {ex}")
+        logger.info(f"## No latest CSA pointer: s3://{bucket_name}/{pointer_key}")
+        return None
+    obj_key = json.loads(s3_res["Body"].read())[csa_pointer_key_str]
+    logger.info(f"## Latest CSA pointer (s3://{bucket_name}/{pointer_key}): {obj_key}")
+    return obj_key
+
+
+# The latest CSA pointer object (of a date) is written by the Process stage, outside the CSA files prefix path (of the
+# date), so it is never listed as a CSA file.
+def get_csa_pointer_key(source_name: str, date: str) -> str:
+    return f"{csa_str}/{os.environ[DEPLOY_ENV]}/{source_name}/{csa_pointer_dir_name}/{date}.json"
+
+
 def s3_list_objects(s3, bucket_name: str, prefix_path: str, continuation_token: str = None) -> dict:
     logger.info(f"## Listing S3 objects in: s3://{bucket_name}/{prefix_path}")
     list_objects_v2_kwargs = {
@@ -60,23 +100,13 @@ def lambda_handler(event, context):
     dt_meta = {yesterday_str: dt_yesterday}
     logger.info(f"## Date Meta: '{dt_meta}'")
 
-    prefix_path = f"{csa_str}/{os.environ[DEPLOY_ENV]}/{os.environ[SOURCE_NAME]}/{dt_yesterday}"
-    s3_res_list = []
-    csa_files = set()
-    is_truncated = True
-    next_continuation_token = None
-    while is_truncated:
-        s3_res = s3_list_objects(
-            s3_client, os.environ[BUCKET_NAME_SOURCE], prefix_path, continuation_token=next_continuation_token
+    bucket_name = os.environ[BUCKET_NAME_SOURCE]
+    if (obj_key := get_csa_pointer(s3_client, bucket_name, os.environ[SOURCE_NAME], dt_yesterday)) is None:
+        # Fallback, for a date written before the latest CSA pointer objects existed.
+        obj_key = get_csa_listed(
+            s3_client, bucket_name, f"{csa_str}/{os.environ[DEPLOY_ENV]}/{os.environ[SOURCE_NAME]}/{dt_yesterday}"
         )
-        s3_res_list.append(s3_res)
-        is_truncated = s3_res["IsTruncated"]
-        if "Contents" in s3_res:
-            csa_files = csa_files.union({i["Key"].rsplit(sep="/", maxsplit=1)[-1] for i in s3_res["Contents"]})
-        if is_truncated and "NextContinuationToken" in s3_res:
-            next_continuation_token = s3_res["NextContinuationToken"]
-    if csa_files_list := sorted(list(csa_files), reverse=True):
-        obj_key = f"{prefix_path}/{csa_files_list[0]}"
+    if obj_key:
         logger.info(f"## Found latest CSA file (for {yesterday_str}): {obj_key}")
         s3_obj = s3_resource.Object(os.environ[BUCKET_NAME_DEST], obj_key)
         try:
@@ -88,7 +118,7 @@ def lambda_handler(event, context):
                 logger.error(f"## Skipping ({ex}): '{obj_key}'")
             else:
                 s3_obj.copy(
-                    CopySource={"Bucket": os.environ[BUCKET_NAME_SOURCE], "Key": obj_key},
+                    CopySource={"Bucket": bucket_name, "Key": obj_key},
                     ExtraArgs={
                         "ExpectedBucketOwner": os.environ[ACCOUNT_OWNER_ID],
                         "StorageClass": os.getenv(STORAGE_CLASS, "GLACIER_IR"),
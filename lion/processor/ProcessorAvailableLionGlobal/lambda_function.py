@@ -1,20 +1,27 @@
+import fcntl
 import json
 import logging
 import os
+import re
 import sys
-from datetime import datetime
-
-import urllib3
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime
+from functools import lru_cache, partial
 
 if "LAMBDA_TASK_ROOT" in os.environ:
     sys.path.insert(0, os.environ["LAMBDA_TASK_ROOT"])
 
 # pylint: disable=wrong-import-position
 import boto3
+from botocore.exceptions import BotoCoreError, ClientError
 import s3fs
-from satpy.readers import find_files_and_readers
+from satpy.readers import configs_for_reader, find_files_and_readers, load_reader
 from sih_lion import __version__ as sih_lion_version
 from sih_lion.file_utils import FileMetaReader, FileMetaReaderSettings
+from trollsift import compose, parse
 
 logger = logging.getLogger()
 # logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)  # Enable to log to stdout, and comment line below.
@@ -28,57 +35,440 @@ SOURCE_NAME = "SOURCE_NAME"
 SAT_DATA_SERVICES = "SAT_DATA_SERVICES"
 LATEST_AVAILABLE_PARAMETER = "LATEST_AVAILABLE_PARAMETER"
 FILENAMES_INFO = "FILENAMES_INFO"
-
-AWS_SESSION_TOKEN = "AWS_SESSION_TOKEN"
-PARAMETERS_SECRETS_EXTENSION_CACHE_ENABLED = "PARAMETERS_SECRETS_EXTENSION_CACHE_ENABLED"
-PARAMETERS_SECRETS_EXTENSION_CACHE_SIZE = "PARAMETERS_SECRETS_EXTENSION_CACHE_SIZE"
-PARAMETERS_SECRETS_EXTENSION_HTTP_PORT = "PARAMETERS_SECRETS_EXTENSION_HTTP_PORT"
-PARAMETERS_SECRETS_EXTENSION_LOG_LEVEL = "PARAMETERS_SECRETS_EXTENSION_LOG_LEVEL"
-PARAMETERS_SECRETS_EXTENSION_MAX_CONNECTIONS = "PARAMETERS_SECRETS_EXTENSION_MAX_CONNECTIONS"
-SECRETS_MANAGER_TIMEOUT_MILLIS = "SECRETS_MANAGER_TIMEOUT_MILLIS"
-SECRETS_MANAGER_TTL = "SECRETS_MANAGER_TTL"
-SSM_PARAMETER_STORE_TIMEOUT_MILLIS = "SSM_PARAMETER_STORE_TIMEOUT_MILLIS"
-SSM_PARAMETER_STORE_TTL = "SSM_PARAMETER_STORE_TTL"
+STATE_STORE_BACKEND = "STATE_STORE_BACKEND"
+STATE_STORE_CACHE_TTL = "STATE_STORE_CACHE_TTL"
+STATE_STORE_DIR = "STATE_STORE_DIR"
+STATE_STORE_TABLE = "STATE_STORE_TABLE"
+KEY_TEMPLATE_PROBING_ENABLED = "KEY_TEMPLATE_PROBING_ENABLED"
+S3FS_LISTING_CACHE_TTL = "S3FS_LISTING_CACHE_TTL"
+WAIT_ENABLED = "WAIT_ENABLED"
+WAIT_INTERVAL_MILLIS = "WAIT_INTERVAL_MILLIS"
+WAIT_INTERVAL_MAX_MILLIS = "WAIT_INTERVAL_MAX_MILLIS"
+TIME_RESERVE_MILLIS = "TIME_RESERVE_MILLIS"
+ARRIVAL_BITMAP_ENABLED = "ARRIVAL_BITMAP_ENABLED"
+ARRIVAL_STATE_PREFIX = "ARRIVAL_STATE_PREFIX"
+ARRIVAL_STATE_EXPIRY = "ARRIVAL_STATE_EXPIRY"
 
 status_str = "status"
 event_str = "event"
+batch_item_failures_str = "batchItemFailures"
+item_identifier_str = "itemIdentifier"
 
 sat_data_source_num_files = "num-files"
 sat_data_source_reader = "reader"
-
-http = urllib3.PoolManager()
+sat_data_source_segment_regex = "segment-regex"  # With one group, of the (1-based) segment number of a filename.
+
+start_timestamp_cache_size: int = 2**17  # Object keys, of which the start timestamps are memoised.
+s3fs_listing_cache_ttl_default: int = 3600  # 1 hour, after which a data service S3 URI prefix is listed in full again.
+wait_interval_millis_default: int = 1000  # The first wait, before re-checking for missing files (doubled each time).
+wait_interval_max_millis_default: int = 16000  # The longest wait, before re-checking for missing files.
+time_reserve_millis_default: int = 10000  # The invocation time to keep in reserve, when waiting for missing files.
+arrival_state_expiry_default: int = 172800  # 2 days, after which an arrival state expires (DynamoDB backend only).
+arrival_state_max_attempts: int = 10  # Concurrent arrivals of the same start time, may conflict on each update.
+arrival_state_store_backends = {"dynamodb", "file"}  # The compare-and-set state store backends, for arrival states.
+state_store_backend_default = "ssm"
+state_store_cache_ttl_default: int = 60  # 1 minute, after which a state is read from the state store again.
+state_store_dir_default = "/tmp/state_store"  # For the local file state store backend.
+
+# The read cache of the state store (kept between warm invocations), of the time read, value and version of each name.
+state_store_cache: dict[str, tuple[float, dict, int]] = {}
+
+# The state store backend clients (kept between warm invocations), created on first use.
+state_store_clients: dict = {}
+
+# The key template of each data service S3 URI prefix and reader (kept between warm invocations), of the filename
+# pattern of the reader up to the start time (with the fields before the start time filled in from a recent file found
+# by the glob), and the start time format (at minute precision), used to get the tight key prefix of the files of a
+# start time.
+key_template_cache: dict[tuple[str, str], tuple[str, str]] = {}
+
+# The S3 filesystem (kept between warm invocations), created on first use, of which the cached listing of each data
+# service S3 URI prefix is refreshed by re-listing the keys from the start time being checked, instead of being
+# invalidated.
+s3fs_filesystem: s3fs.S3FileSystem = None
+
+# The FileMetaReader (kept between warm invocations), created on first use.
+file_meta_reader: FileMetaReader = None
+
+# The fast path start timestamp parsers, by source name prefix, each of a compiled regex for the filenames of the
+# source, and a function to get the start timestamp (e.g. 202305101200) from the regex match.
+fast_path_start_timestamp_parsers: dict[str, tuple[re.Pattern, callable]] = {
+    "goes": (
+        re.compile(r"OR_ABI-[\w-]+_G\d{2}_s(\d{4})(\d{3})(\d{4})\d*_e\d+_c\d+\.nc"),
+        lambda m: int(date.fromordinal(date(int(m[1]), 1, 1).toordinal() + int(m[2]) - 1).strftime("%Y%m%d") + m[3]),
+    ),
+    "himawari": (
+        re.compile(r"HS_H\d{2}_(\d{8})_(\d{4})_B\d{2}_\w+\.DAT(?:\.bz2)?"),
+        lambda m: int(m[1] + m[2]),
+    ),
+}
+
+# Whether the fast path start timestamp parser of each (source name, data service) agrees with the FileMetaReader,
+# as checked on the first filename it matches (kept between warm invocations).
+fast_path_start_timestamp_checks: dict[tuple[str, str], bool] = {}
+
+
+def get_arrival_state_name(data_service: str, start_time: str) -> str:
+    arrival_state_prefix = os.getenv(ARRIVAL_STATE_PREFIX, f"{os.environ[LATEST_AVAILABLE_PARAMETER]}/arrivals")
+    return f"{arrival_state_prefix}/{data_service}/{start_time}"
+
+
+# Get the files of the latest start time of a data service, or None if NOT all the expected files were found, in which
+# case the checks of the other data services are cancelled (as the stage fails anyway).
+def get_data_service_files(
+    s3,
+    s3fs_: s3fs.S3FileSystem,
+    data_service: str,
+    sat_data_source_meta: dict,
+    s3_uri_props: tuple[str, str],
+    context,
+    cancelled: threading.Event,
+) -> list[str]:
+    num_files_required = int(sat_data_source_meta[sat_data_source_num_files])
+    s3_uri_prefix, latest_start_time = s3_uri_props
+    # Wait for any missing files within this invocation (if enabled), instead of failing (and being retried).
+    if json.loads(os.getenv(ARRIVAL_BITMAP_ENABLED, "false").lower()) and (
+        missing_segments := wait_for(
+            partial(get_missing_segments, data_service, latest_start_time, num_files_required),
+            lambda missing_segments: not missing_segments,
+            context,
+            cancelled,
+        )
+    ):
+        logger.info(
+            f"## Did NOT find the expected {num_files_required} files (for data service: '{data_service}'), "
+            f"missing segments: {missing_segments} ..."
+        )
+        cancelled.set()
+        return None
+    files = wait_for(
+        partial(get_files, s3, s3fs_, data_service, sat_data_source_meta, s3_uri_prefix, latest_start_time, {}),
+        lambda files: len(files) >= num_files_required,
+        context,
+        cancelled,
+    )
+    if len(files) < num_files_required:
+        logger.info(f"## Did NOT find the expected {num_files_required} files (for data service: '{data_service}') ...")
+        cancelled.set()
+        return None
+    return files
+
+
+def get_file_meta_reader() -> FileMetaReader:
+    global file_meta_reader  # pylint: disable=global-statement
+    if file_meta_reader is None:
+        settings = FileMetaReaderSettings()
+        logger.info(f"## FileMetaReaderSettings: '{settings.filenames_info}'")
+        file_meta_reader = FileMetaReader(settings)
+    return file_meta_reader
+
+
+# Get the files of the latest start time of a data service. The listing state carries whether the S3 URI prefix was
+# globbed (for the key template probing), and the last listed key of an earlier start time, of the fallback (manual)
+# listing between re-checks, so that a re-check only lists the keys from the start time (as the keys of a data service
+# sort by start time), which still finds a file of the start time which sorts before a newer key.
+def get_files(
+    s3,
+    s3fs_: s3fs.S3FileSystem,
+    data_service: str,
+    sat_data_source_meta: dict,
+    s3_uri_prefix: str,
+    latest_start_time: str,
+    listing_state: dict,
+) -> list[str]:
+    s3_uri_full: str = f"{s3_uri_prefix}*{latest_start_time}*"
+    logger.info(f"## Getting Files (for S3 URI): '{s3_uri_full}'")
+    if sat_data_source_reader in sat_data_source_meta and (reader_val := sat_data_source_meta[sat_data_source_reader]):
+        files = None
+        if probing := json.loads(os.getenv(KEY_TEMPLATE_PROBING_ENABLED, "false").lower()):
+            logger.info(f"## Using Reader '{reader_val}' key template (for S3 URI): '{s3_uri_full}'")
+            # No probed files means no files of the start time yet, or an out of date key template (e.g. the filenames
+            # changed with a new satellite), so the S3 URI prefix is globbed (once per check of a start time) to tell.
+            if (files := get_probed_files(s3, s3_uri_prefix, reader_val, latest_start_time)) == [] and (
+                not listing_state.get("globbed")
+            ):
+                files = None
+        if files is None:
+            logger.info(f"## Using Reader '{reader_val}' (for S3 URI): '{s3_uri_full}'")
+            start_end_time = datetime.strptime(latest_start_time, "%Y%m%d%H%M")
+            refresh_s3fs_listing(s3, s3_uri_prefix, reader_val, start_end_time)
+            try:
+                files_and_readers_mapping = find_files_and_readers(
+                    base_dir=s3_uri_prefix,
+                    fs=s3fs_,
+                    reader=reader_val,
+                    start_time=start_end_time,
+                    end_time=start_end_time,
+                )
+                files = files_and_readers_mapping[reader_val]
+            except ValueError as ex:
+                logger.debug(
+                    f"## Using Reader '{reader_val}' (for data service: '{data_service}'), did NOT work ... : {ex}"
+                )
+                files = []
+            listing_state["globbed"] = True
+            if probing:
+                set_key_template(s3_uri_prefix, reader_val, files[-1] if files else None)
+        logger.info(f"## Files: '{files}'")
+        if files:
+            logger.info(f"## Using Reader '{reader_val}' (for data service: '{data_service}'), found: {len(files)}")
+    else:
+        logger.info(f"## Fallback - Manually Getting Files (for S3 URI): '{s3_uri_full}'")
+        s3_uri = (s3_uri_prefix if s3_uri_prefix[-1] != "/" else s3_uri_prefix[:-1]).rsplit(sep="/", maxsplit=3)
+        bucket_name = s3_uri[0].replace("s3://", "", 1)
+        prefix_path = "/".join(s3_uri[-3:])
+        files = []
+        start_after = listing_state.get("start_after")
+        is_truncated = True
+        next_continuation_token = None
+        while is_truncated:
+            s3_res = s3_list_objects(
+                s3, bucket_name, prefix_path, continuation_token=next_continuation_token, start_after=start_after
+            )
+            is_truncated = s3_res["IsTruncated"]
+            for i in s3_res.get("Contents", []):
+                if valid_timestamp(i, latest_start_time, data_service):
+                    files.append(f"{bucket_name}/{i['Key']}")
+                elif (
+                    not files
+                    and (timestamp := get_start_timestamp(os.environ[SOURCE_NAME], data_service, i["Key"])) is not None
+                    and timestamp < int(latest_start_time)
+                ):
+                    listing_state["start_after"] = i["Key"]
+            if is_truncated and "NextContinuationToken" in s3_res:
+                next_continuation_token = s3_res["NextContinuationToken"]
+        logger.info(f"## Files: '{files}'")
+        logger.info(f"## Manual reading (for data service: '{data_service}'), found: {len(files)}")
+    return files
+
+
+def get_latest_available_start_times() -> tuple[dict, int]:
+    logger.info("## Getting latest available start times")
+    return get_states([os.environ[LATEST_AVAILABLE_PARAMETER]])[os.environ[LATEST_AVAILABLE_PARAMETER]]
+
+
+# Get the start timestamp (e.g. 202305101200) of an S3 object, or None if the object is not a file of the data
+# service. Known filename shapes are parsed by the fast path parser of the source, and anything else by the
+# FileMetaReader. Memoised by object key, so the keys of a prefix are only parsed once per container.
+@lru_cache(maxsize=start_timestamp_cache_size)
+def get_start_timestamp(source_name: str, data_service: str, obj_key: str) -> int:
+    filename = obj_key.rsplit(sep="/", maxsplit=1)[-1]
+    check_key = (source_name, data_service)
+    for source_name_prefix, (pattern, get_timestamp) in fast_path_start_timestamp_parsers.items():
+        if (
+            source_name.startswith(source_name_prefix)
+            and fast_path_start_timestamp_checks.get(check_key, True)
+            and (match := pattern.fullmatch(filename))
+        ):
+            timestamp = get_timestamp(match)
+            if check_key in fast_path_start_timestamp_checks:
+                return timestamp
+            reader_timestamp = get_start_timestamp_reader(source_name, data_service, obj_key)
+            fast_path_start_timestamp_checks[check_key] = timestamp == reader_timestamp
+            if not fast_path_start_timestamp_checks[check_key]:
+                logger.warning(
+                    f"## Disabled the fast path start timestamp parser (for data service: '{data_service}'), "
+                    f"as it got '{timestamp}' instead of '{reader_timestamp}' for: '{obj_key}'"
+                )
+            return reader_timestamp
+    return get_start_timestamp_reader(source_name, data_service, obj_key)
+
+
+# Get the (1-based) segment numbers, of the files of a start time of a data service, which have NOT arrived yet.
+def get_missing_segments(data_service: str, start_time: str, num_files_required: int) -> list[int]:
+    arrival_state_name = get_arrival_state_name(data_service, start_time)
+    bitmap: int = get_states([arrival_state_name], use_cache=False)[arrival_state_name][0].get("bitmap", 0)
+    missing_segments = [i + 1 for i in range(num_files_required) if not bitmap >> i & 1]
+    logger.info(f"## Missing segments (for data service: '{data_service}'): {missing_segments}")
+    return missing_segments
+
+
+def get_notification_s3_records(record: dict) -> list[dict]:
+    if "Sns" in record:
+        body = json.loads(record["Sns"]["Message"])
+    else:
+        body = json.loads(record["body"])
+        if body.get("Type") == "Notification" and "Message" in body:
+            body = json.loads(body["Message"])
+    # E.g. an 's3:TestEvent' has no records.
+    return body.get("Records", [])
+
+
+# Get the files of a start time, by listing only the tight key prefix (from the key template) of the files, instead of
+# globbing the whole data service S3 URI prefix. Returns None if there is no key template (e.g. NOT globbed yet).
+def get_probed_files(s3, s3_uri_prefix: str, reader: str, latest_start_time: str) -> list[str]:
+    bucket_name, _, prefix_path = s3_uri_prefix.replace("s3://", "", 1).partition("/")
+    if (key_template := key_template_cache.get((f"{bucket_name}/{prefix_path}", reader))) is None:
+        return None
+    start_time = datetime.strptime(latest_start_time, "%Y%m%d%H%M")
+    key_prefix = f"{prefix_path}{key_template[0]}{start_time.strftime(key_template[1])}"
+    logger.info(f"## Probing files (for key prefix): 's3://{bucket_name}/{key_prefix}'")
+    files = []
+    is_truncated = True
+    next_continuation_token = None
+    while is_truncated:
+        s3_res = s3_list_objects(s3, bucket_name, key_prefix, continuation_token=next_continuation_token)
+        is_truncated = s3_res["IsTruncated"]
+        if "Contents" in s3_res:
+            files += [
+                f"{bucket_name}/{i['Key']}"
+                for i in s3_res["Contents"]
+                if valid_reader_start_time(i["Key"], reader, start_time)
+            ]
+        if is_truncated and "NextContinuationToken" in s3_res:
+            next_continuation_token = s3_res["NextContinuationToken"]
+    return files
+
+
+# Get the start time (at minute precision) of a file, from the first filename pattern of the reader (with a start time)
+# it matches, or None if the file matches none.
+def get_reader_start_time(obj_key: str, reader: str) -> datetime:
+    filename = obj_key.rsplit(sep="/", maxsplit=1)[-1]
+    for pattern in get_reader_file_patterns(reader):
+        try:
+            fields = parse(pattern, filename)
+        except ValueError:
+            continue
+        if "start_time" in fields:
+            return fields["start_time"].replace(second=0, microsecond=0)
+    return None
 
 
-def get_latest_available_start_times(data_service: str) -> dict:
-    logger.info(f"## Getting latest available start time (for data service: '{data_service}')")
-    return json.loads(retrieve_extension_value_param(name=os.environ[LATEST_AVAILABLE_PARAMETER]))
+@lru_cache(maxsize=None)
+def get_reader_file_patterns(reader: str) -> tuple[str]:
+    return tuple(load_reader(next(configs_for_reader(reader))).file_patterns)
 
 
-# Define function to retrieve values from extension local HTTP server cache
-def retrieve_extension_value(url: str) -> dict:
-    url = f"http://localhost:{os.environ[PARAMETERS_SECRETS_EXTENSION_HTTP_PORT]}{url}"
-    res = http.request("GET", url, headers={"X-Aws-Parameters-Secrets-Token": os.environ[AWS_SESSION_TOKEN]})
-    return json.loads(res.data)
+def get_segment(sat_data_source_meta: dict, obj_key: str) -> int:
+    if not (segment_regex := sat_data_source_meta.get(sat_data_source_segment_regex)):
+        return 1  # A single file per start time.
+    match = re.search(segment_regex, obj_key.rsplit(sep="/", maxsplit=1)[-1])
+    return int(match.group(1)) if match else None
 
 
-# Load Parameter Store values from extension
-def retrieve_extension_value_param(name: str) -> str:
-    logger.info(f"## Loading AWS Systems Manager Parameter Store value: {name}")
-    ssm_res = retrieve_extension_value(f"/systemsmanager/parameters/get/?name={name}")
-    logger.info(f"## SSM Get Parameter (extension) response: {ssm_res}")
-    return ssm_res["Parameter"]["Value"]
+def get_s3fs() -> s3fs.S3FileSystem:
+    global s3fs_filesystem  # pylint: disable=global-statement
+    if s3fs_filesystem is None:
+        s3fs_filesystem = s3fs.S3FileSystem(
+            anon=False,  # Default: Will use boto3's credential resolver
+            use_listings_cache=True,
+            listings_expiry_time=int(os.getenv(S3FS_LISTING_CACHE_TTL, str(s3fs_listing_cache_ttl_default))),
+        )
+    return s3fs_filesystem
 
 
-def s3_list_objects(s3, bucket_name: str, prefix_path: str, continuation_token: str = None) -> dict:
+def get_start_timestamp_reader(source_name: str, data_service: str, obj_key: str) -> int:
+    meta = get_file_meta_reader().find_filename_meta(source_name, obj_key, file_types=[data_service])
+    logger.info(f"## File Meta: '{meta}'")
+    return int(meta["start_time"].strftime("%Y%m%d%H%M")) if meta is not None else None
+
+
+# Refresh the cached listing (if any) of a data service S3 URI prefix, by re-listing the keys after the last cached key
+# of an earlier start time (as S3 lists keys in UTF-8 binary order, and the filenames of a data service only differ from
+# the start time on, so sort by start time). So a file of the start time which sorts before a newer cached key (e.g.
+# copied out of order) is still found. The listing is updated in place, so it still expires with its TTL.
+def refresh_s3fs_listing(s3, s3_uri_prefix: str, reader: str, start_time: datetime) -> None:
+    path = s3_uri_prefix.replace("s3://", "", 1).rstrip("/")
+    try:
+        listing: list[dict] = get_s3fs().dircache[path]
+    except KeyError:
+        return  # Not listed yet, or expired, so the whole prefix is listed (by the glob) anyway.
+    files = sorted((i for i in listing if i["type"] == "file"), key=lambda i: i["name"])
+    # Bisect for the first cached file of the start time (or later, or NOT matching the reader).
+    lo, hi = 0, len(files)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if (file_start_time := get_reader_start_time(files[mid]["name"], reader)) is not None and (
+            file_start_time < start_time
+        ):
+            lo = mid + 1
+        else:
+            hi = mid
+    if lo == 0:
+        # No cached file of an earlier start time to list after, so list the whole prefix again.
+        get_s3fs().invalidate_cache(path=s3_uri_prefix)
+        return
+    bucket_name, _, prefix_path = path.partition("/")
+    start_after = files[lo - 1]["name"].split(sep="/", maxsplit=1)[1]
+    logger.info(f"## Refreshing cached listing of '{s3_uri_prefix}' after: '{start_after}'")
+    new_listing = []
+    is_truncated = True
+    next_continuation_token = None
+    while is_truncated:
+        s3_res = s3_list_objects(
+            s3, bucket_name, f"{prefix_path}/", continuation_token=next_continuation_token, start_after=start_after
+        )
+        is_truncated = s3_res["IsTruncated"]
+        for i in s3_res.get("Contents", []):
+            if "/" in i["Key"][len(prefix_path) + 1 :]:
+                # A new sub directory is not in the cached (one level) listing, so list the whole prefix again.
+                get_s3fs().invalidate_cache(path=s3_uri_prefix)
+                return
+            name = f"{bucket_name}/{i['Key']}"
+            new_listing.append({**i, "Key": name, "name": name, "size": i["Size"], "type": "file"})
+        if is_truncated and "NextContinuationToken" in s3_res:
+            next_continuation_token = s3_res["NextContinuationToken"]
+    logger.info(f"## Refreshed cached listing of '{s3_uri_prefix}', with re-listed keys: {len(new_listing)}")
+    listing[:] = [i for i in listing if i["type"] != "file"] + files[:lo] + new_listing
+
+
+# Set the key template of a data service S3 URI prefix and reader, from a recent file (found by the glob). With no file
+# found, the key template is only dropped (to be made again) if it is out of date, i.e. the newest key of the cached
+# listing of the S3 URI prefix no longer starts with it.
+def set_key_template(s3_uri_prefix: str, reader: str, obj_key: str) -> None:
+    key_template_cache_key = (s3_uri_prefix.replace("s3://", "", 1), reader)
+    if obj_key is None:
+        if (key_template := key_template_cache.get(key_template_cache_key)) is None:
+            return
+        try:
+            listing: list[dict] = get_s3fs().dircache[key_template_cache_key[0].rstrip("/")]
+        except KeyError:
+            return
+        if file_names := [i["name"] for i in listing if i["type"] == "file"]:
+            obj_key = max(file_names)
+            if obj_key.rsplit(sep="/", maxsplit=1)[-1].startswith(key_template[0]):
+                return
+        logger.info(f"## Key template (for reader '{reader}') is out of date: {key_template}, newest file: '{obj_key}'")
+        del key_template_cache[key_template_cache_key]
+        return
+    filename = obj_key.rsplit(sep="/", maxsplit=1)[-1]
+    for pattern in get_reader_file_patterns(reader):
+        if "{start_time:" not in pattern:
+            continue
+        try:
+            fields = parse(pattern, filename)
+        except ValueError:
+            continue
+        pattern_head, pattern_tail = pattern.split("{start_time:", maxsplit=1)
+        start_time_format = pattern_tail.split("}", maxsplit=1)[0]
+        if "%M" in start_time_format:
+            start_time_format = start_time_format[: start_time_format.index("%M") + 2]
+        key_template = (compose(pattern_head, fields), start_time_format)
+        if key_template_cache.get(key_template_cache_key) != key_template:
+            key_template_cache[key_template_cache_key] = key_template
+            logger.info(f"## Key template (for reader '{reader}'): {key_template}")
+        return
+    logger.info(f"## Could NOT match a filename pattern of reader '{reader}' to: '{filename}'")
+
+
+def s3_list_objects(
+    s3,
+    bucket_name: str,
+    prefix_path: str,
+    continuation_token: str = None,
+    max_keys: int = 1000,
+    start_after: str = None,
+) -> dict:
     logger.info(f"## Listing S3 objects in: s3://{bucket_name}/{prefix_path}")
     list_objects_v2_kwargs = {
         k: v
         for k, v in {
             "Bucket": bucket_name,
-            "MaxKeys": 1000,
+            "MaxKeys": max_keys,
             "Prefix": prefix_path,
             "ExpectedBucketOwner": os.environ[ACCOUNT_OWNER_ID],
             "ContinuationToken": continuation_token if continuation_token else None,
+            "StartAfter": start_after if start_after else None,
         }.items()
         if v
     }
@@ -87,44 +477,220 @@ def s3_list_objects(s3, bucket_name: str, prefix_path: str, continuation_token:
     return s3_res
 
 
-def set_latest_available_start_times(ssm, latest_available_start_times_new: dict[str, str]) -> None:
-    logger.info(
-        f"## Setting the new latest available start time SSM parameter to: '{latest_available_start_times_new}'"
-    )
-    ssm_res = ssm.put_parameter(
-        Name=os.environ[LATEST_AVAILABLE_PARAMETER],
-        # Description,  # Default to the existing description
-        Value=json.dumps(latest_available_start_times_new),
-        Type="String",
-        Overwrite=True,
-        # TODO: (OPTIONAL) A regular expression used to validate the parameter value.
-        # AllowedPattern=,
-        Tier="Standard",
-        DataType="text",
+# Set the arrival of segments (as bits) in the arrival bitmap of a start time of a data service, retrying on conflict.
+def set_arrivals(arrival_state_name: str, arrivals: int) -> bool:
+    expires_in = int(os.getenv(ARRIVAL_STATE_EXPIRY, str(arrival_state_expiry_default)))
+    for _ in range(arrival_state_max_attempts):
+        value, version = get_states([arrival_state_name], use_cache=False)[arrival_state_name]
+        bitmap: int = value.get("bitmap", 0)
+        if bitmap | arrivals == bitmap or set_state(
+            arrival_state_name, {"bitmap": bitmap | arrivals}, version, expires_in=expires_in
+        ):
+            return True
+    logger.error(f"## Could NOT set the arrivals ({arrivals:b}) of: '{arrival_state_name}'")
+    return False
+
+
+def set_latest_available_start_times(latest_available_start_times_new: dict[str, str], version: int) -> bool:
+    logger.info(f"## Setting the new latest available start time to: '{latest_available_start_times_new}'")
+    return set_state(os.environ[LATEST_AVAILABLE_PARAMETER], latest_available_start_times_new, version)
+
+
+def get_state_store_client():
+    if (backend := os.getenv(STATE_STORE_BACKEND, state_store_backend_default)) not in state_store_clients:
+        state_store_clients[backend] = boto3.client(backend, region_name=os.environ["AWS_REGION"])
+    return state_store_clients[backend]
+
+
+def get_state_store_file_path(name: str) -> str:
+    return os.path.join(
+        os.getenv(STATE_STORE_DIR, state_store_dir_default), f"{name.strip('/').replace('/', '_')}.json"
     )
+
+
+# Get the states (each of a value and a version) of one or more names, from the in-process read cache, or else in a
+# batch from the state store backend. A name without a state has an empty value, and version 0.
+def get_states(names: list[str], use_cache: bool = True) -> dict[str, tuple[dict, int]]:
+    state_store_cache_ttl = int(os.getenv(STATE_STORE_CACHE_TTL, str(state_store_cache_ttl_default)))
+    now = time.monotonic()
+    states = {
+        name: (cached[1], cached[2])
+        for name in names
+        if use_cache and (cached := state_store_cache.get(name)) and now - cached[0] < state_store_cache_ttl
+    }
+    if names_uncached := [name for name in names if name not in states]:
+        backend = os.getenv(STATE_STORE_BACKEND, state_store_backend_default)
+        logger.info(f"## Getting states (from state store: '{backend}'): {names_uncached}")
+        for name, (value, version) in state_store_backends[backend][0](names_uncached).items():
+            state_store_cache[name] = (now, value, version)
+            states[name] = (value, version)
+    return states
+
+
+# Set the state of a name, only if its version is still the version the value was based on (compare-and-set, except
+# in the SSM backend, see 'ssm_set_state'). Returns False, and drops the name from the read cache, if the state was
+# changed by someone else in the meantime.
+# Optionally, the state expires after a number of seconds (if supported by the state store backend).
+def set_state(name: str, value: dict, version: int, expires_in: int = None) -> bool:
+    backend = os.getenv(STATE_STORE_BACKEND, state_store_backend_default)
+    logger.info(f"## Setting state (in state store: '{backend}') of '{name}' (version: {version}) to: '{value}'")
+    if not (version_new := state_store_backends[backend][1](name, value, version, expires_in)):
+        logger.info(f"## State (in state store: '{backend}') of '{name}' is no longer version: {version}")
+        state_store_cache.pop(name, None)
+        return False
+    state_store_cache[name] = (time.monotonic(), value, version_new)
+    return True
+
+
+def dynamodb_get_states(names: list[str]) -> dict[str, tuple[dict, int]]:
+    dynamodb = get_state_store_client()
+    table_name: str = os.environ[STATE_STORE_TABLE]
+    states = {name: ({}, 0) for name in names}
+    request_items = {table_name: {"Keys": [{"name": {"S": name}} for name in names], "ConsistentRead": True}}
+    while request_items:
+        dynamodb_res = dynamodb.batch_get_item(RequestItems=request_items)
+        logger.debug(f"## DynamoDB Batch Get Item response: {dynamodb_res}")
+        for item in dynamodb_res["Responses"].get(table_name, []):
+            states[item["name"]["S"]] = (json.loads(item["value"]["S"]), int(item["version"]["N"]))
+        request_items = dynamodb_res.get("UnprocessedKeys")
+    return states
+
+
+def dynamodb_set_state(name: str, value: dict, version: int, expires_in: int = None) -> int:
+    dynamodb = get_state_store_client()
+    item = {"name": {"S": name}, "value": {"S": json.dumps(value)}, "version": {"N": str(version + 1)}}
+    if expires_in:
+        # For the Time to Live (TTL) of the table, if enabled on the 'expires_at' attribute.
+        item["expires_at"] = {"N": str(int(time.time()) + expires_in)}
+    try:
+        dynamodb.put_item(
+            TableName=os.environ[STATE_STORE_TABLE],
+            Item=item,
+            ConditionExpression="attribute_not_exists(#name)" if not version else "#version = :version",
+            ExpressionAttributeNames={"#name": "name"} if not version else {"#version": "version"},
+            **({"ExpressionAttributeValues": {":version": {"N": str(version)}}} if version else {}),
+        )
+    except dynamodb.exceptions.ConditionalCheckFailedException:
+        return 0
+    return version + 1
+
+
+def file_get_states(names: list[str]) -> dict[str, tuple[dict, int]]:
+    states = {}
+    for name in names:
+        try:
+            with open(get_state_store_file_path(name), encoding="utf-8") as f:
+                state = json.load(f)
+            states[name] = (state["value"], state["version"])
+        except FileNotFoundError:
+            states[name] = ({}, 0)
+    return states
+
+
+# States do not expire in the local file state store backend.
+def file_set_state(name: str, value: dict, version: int, expires_in: int = None) -> int:
+    file_path = get_state_store_file_path(name)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(f"{file_path}.lock", "w", encoding="utf-8") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        if file_get_states([name])[name][1] != version:
+            return 0
+        with open(f"{file_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump({"value": value, "version": version + 1}, f)
+        os.replace(f"{file_path}.tmp", file_path)
+    return version + 1
+
+
+def ssm_get_states(names: list[str]) -> dict[str, tuple[dict, int]]:
+    ssm = get_state_store_client()
+    states = {name: ({}, 0) for name in names}
+    for i in range(0, len(names), 10):  # Up to 10 names per request
+        ssm_res = ssm.get_parameters(Names=names[i : i + 10])
+        logger.info(f"## SSM Get Parameters response: {ssm_res}")
+        for parameter in ssm_res["Parameters"]:
+            states[parameter["Name"]] = (json.loads(parameter["Value"]), parameter["Version"])
+    return states
+
+
+# SSM parameter policies (e.g. expiration) need the Advanced tier, so states do not expire in the SSM backend.
+def ssm_set_state(name: str, value: dict, version: int, expires_in: int = None) -> int:
+    ssm = get_state_store_client()
+    # SSM has no conditional overwrite (only a conditional create), so the version is only checked before the
+    # overwrite. A concurrent write in between is NOT detected: the last writer wins (and is the one that succeeds),
+    # so use the DynamoDB backend wherever concurrent writers must not lose each other's updates.
+    if version and ssm_get_states([name])[name][1] != version:
+        return 0
+    try:
+        ssm_res = ssm.put_parameter(
+            Name=name,
+            # Description,  # Default to the existing description
+            Value=json.dumps(value),
+            Type="String",
+            Overwrite=bool(version),
+            # TODO: (OPTIONAL) A regular expression used to validate the parameter value.
+            # AllowedPattern=,
+            Tier="Standard",
+            DataType="text",
+        )
+    except ssm.exceptions.ParameterAlreadyExists:
+        return 0
     logger.info(f"## SSM Put Parameter response: {ssm_res}")
+    return ssm_res["Version"]
+
+
+# The state store backends, each of a batched get states function, and a set state function (returning the new version,
+# or 0 if the state is no longer the version). Only the DynamoDB and file backends compare-and-set.
+state_store_backends: dict[str, tuple[callable, callable]] = {
+    "dynamodb": (dynamodb_get_states, dynamodb_set_state),
+    "file": (file_get_states, file_set_state),
+    "ssm": (ssm_get_states, ssm_set_state),
+}
 
 
 def status_failed(responses: dict) -> dict:
     return {status_str: "FAILED", event_str: responses}
 
 
-def valid_timestamp(i, latest_start_time: str, data_service: str, reader: FileMetaReader) -> int:
+def valid_timestamp(i, latest_start_time: str, data_service: str) -> str:
     obj_key = i["Key"]
     logger.debug(
         f"## Checking for valid timestamp: '{obj_key}' (data service: '{data_service}', "
         f"old latest start time: '{latest_start_time}')"
     )
-    meta = reader.find_filename_meta(os.environ[SOURCE_NAME], obj_key, file_types=[data_service])
-    logger.info(f"## File Meta: '{meta}'")
-    if meta is not None:
-        timestamp = meta["start_time"].strftime("%Y%m%d%H%M")
-        logger.info(f"## Timestamp: '{timestamp}'")
-        if int(timestamp) == int(latest_start_time):
-            return timestamp
+    timestamp = get_start_timestamp(os.environ[SOURCE_NAME], data_service, obj_key)
+    logger.info(f"## Timestamp: '{timestamp}'")
+    if timestamp is not None and timestamp == int(latest_start_time):
+        return str(timestamp)
     return None
 
 
+# Whether a file matches a filename pattern of the reader, with a start time (at minute precision) of the start time.
+def valid_reader_start_time(obj_key: str, reader: str, start_time: datetime) -> bool:
+    return get_reader_start_time(obj_key, reader) == start_time
+
+
+# Re-check (with backoff, if waiting is enabled) until the result of the check is done, or there is no time left to
+# wait in the invocation, or the wait is cancelled.
+def wait_for(check: callable, done: callable, context, cancelled: threading.Event):
+    result = check()
+    wait_interval_millis = int(os.getenv(WAIT_INTERVAL_MILLIS, str(wait_interval_millis_default)))
+    wait_interval_max_millis = int(os.getenv(WAIT_INTERVAL_MAX_MILLIS, str(wait_interval_max_millis_default)))
+    time_reserve_millis = int(os.getenv(TIME_RESERVE_MILLIS, str(time_reserve_millis_default)))
+    while (
+        not done(result)
+        and not cancelled.is_set()
+        and json.loads(os.getenv(WAIT_ENABLED, "false").lower())
+        and hasattr(context, "get_remaining_time_in_millis")
+        and context.get_remaining_time_in_millis() > time_reserve_millis + wait_interval_millis
+    ):
+        logger.info(f"## Re-checking in {wait_interval_millis} ms ...")
+        if cancelled.wait(wait_interval_millis / 1000):
+            break
+        result = check()
+        wait_interval_millis = min(wait_interval_millis * 2, wait_interval_max_millis)
+    return result
+
+
 def lambda_handler(event, context):
     env_keys = {
         ACCOUNT_OWNER_ID,
@@ -133,20 +699,16 @@ def lambda_handler(event, context):
         SAT_DATA_SERVICES,
         LATEST_AVAILABLE_PARAMETER,
         FILENAMES_INFO,
-        AWS_SESSION_TOKEN,
-        PARAMETERS_SECRETS_EXTENSION_CACHE_ENABLED,
-        PARAMETERS_SECRETS_EXTENSION_CACHE_SIZE,
-        PARAMETERS_SECRETS_EXTENSION_HTTP_PORT,
-        PARAMETERS_SECRETS_EXTENSION_LOG_LEVEL,
-        PARAMETERS_SECRETS_EXTENSION_MAX_CONNECTIONS,
-        SECRETS_MANAGER_TIMEOUT_MILLIS,
-        SECRETS_MANAGER_TTL,
-        SSM_PARAMETER_STORE_TIMEOUT_MILLIS,
-        SSM_PARAMETER_STORE_TTL,
     }
     if not all(k in os.environ for k in env_keys):
         logger.error(f"## One or more of {env_keys} is not set in ENVIRONMENT VARIABLES: {os.environ}")
         sys.exit(1)
+    if (backend := os.getenv(STATE_STORE_BACKEND, state_store_backend_default)) not in state_store_backends:
+        logger.error(f"## The state store backend '{backend}' is not one of: {list(state_store_backends)}")
+        sys.exit(1)
+    if json.loads(os.getenv(ARRIVAL_BITMAP_ENABLED, "false").lower()) and backend not in arrival_state_store_backends:
+        logger.error(f"## The arrival bitmap needs a state store backend of: {sorted(arrival_state_store_backends)}")
+        sys.exit(1)
 
     logger.info(f"## EVENT: {event}")
 
@@ -156,89 +718,52 @@ def lambda_handler(event, context):
         event = tmp_event
 
     s3 = boto3.client("s3", region_name=os.environ["AWS_REGION"])
-    ssm = boto3.client("ssm", region_name=os.environ["AWS_REGION"])
-    logger.info("## Connected to S3 and SSM via client")
-
-    s3fs_ = s3fs.S3FileSystem(anon=False)  # Default: Will use boto3's credential resolver
-
-    data_service_files: dict[str, dict[str, list[str]]] = {}
-    new_latest_available_start_times: dict[str, str] = {}
-    settings = FileMetaReaderSettings()
-    logger.info(f"## FileMetaReaderSettings: '{settings.filenames_info}'")
-    file_meta_reader = FileMetaReader(settings)
-    for data_service, s3_uri_props in event[os.environ[EVENT_META_KEY]]["data_service_s3_uri_props"].items():
-        sat_data_source_meta = json.loads(os.environ[SAT_DATA_SERVICES])[data_service]
-        num_files_required = int(sat_data_source_meta[sat_data_source_num_files])
-        s3_uri_prefix: str = s3_uri_props[0]
-        latest_start_time: str = s3_uri_props[1]
-        if (
-            (latest_available_start_times := get_latest_available_start_times(data_service))
-            and data_service in latest_available_start_times
-            and int(latest_start_time) < int(latest_available_start_times[data_service])
-        ):
+    logger.info("## Connected to S3 via client")
+
+    s3fs_ = get_s3fs()
+
+    sat_data_services: dict[str, dict] = dict(json.loads(os.environ[SAT_DATA_SERVICES]))
+    data_service_s3_uri_props: dict[str, list[str]] = event[os.environ[EVENT_META_KEY]]["data_service_s3_uri_props"]
+    latest_available_start_times, latest_available_start_times_version = get_latest_available_start_times()
+    for data_service, s3_uri_props in data_service_s3_uri_props.items():
+        latest_available_start_time = latest_available_start_times.get(data_service)
+        if latest_available_start_time and int(s3_uri_props[1]) < int(latest_available_start_time):
             # Bomb out if there are newer s3 objects, which are already available.
             return {status_str: "BOMB-OUT", event_str: event}
-        new_latest_available_start_times[data_service] = latest_start_time
-        s3_uri_full: str = f"{s3_uri_prefix}*{latest_start_time}*"
-
-        logger.info(f"## Getting Files (for S3 URI): '{s3_uri_full}'")
-        if sat_data_source_reader in sat_data_source_meta and (
-            reader_val := sat_data_source_meta[sat_data_source_reader]
-        ):
-            logger.info(f"## Using Reader '{reader_val}' (for S3 URI): '{s3_uri_full}'")
-            start_end_time = datetime.strptime(latest_start_time, "%Y%m%d%H%M")
-            try:
-                files_and_readers_mapping = find_files_and_readers(
-                    base_dir=s3_uri_prefix,
-                    fs=s3fs_,
-                    reader=reader_val,
-                    start_time=start_end_time,
-                    end_time=start_end_time,
-                )
-                files = files_and_readers_mapping[reader_val]
-            except ValueError as ex:
-                logger.debug(
-                    f"## Using Reader '{reader_val}' (for data service: '{data_service}'), did NOT work ... : {ex}"
-                )
+    new_latest_available_start_times: dict[str, str] = {k: v[1] for k, v in data_service_s3_uri_props.items()}
+
+    get_file_meta_reader()
+
+    # Check the files of each data service concurrently, cancelling the remaining checks as soon as one data service
+    # does NOT have all the expected files.
+    data_service_files: dict[str, list[str]] = {}
+    cancelled = threading.Event()
+    with ThreadPoolExecutor(max_workers=len(data_service_s3_uri_props)) as executor:
+        futures = {
+            executor.submit(
+                get_data_service_files,
+                s3,
+                s3fs_,
+                data_service,
+                sat_data_services[data_service],
+                s3_uri_props,
+                context,
+                cancelled,
+            ): data_service
+            for data_service, s3_uri_props in data_service_s3_uri_props.items()
+        }
+        for future in as_completed(futures):
+            if (files := future.result()) is None:
+                cancelled.set()
+                for f in futures:
+                    f.cancel()
                 return status_failed(event)
-            logger.info(f"## Files: '{files}'")
-            num_files_found = len(files)
-            if num_files_found:
-                logger.info(
-                    f"## Using Reader '{reader_val}' (for data service: '{data_service}'), found: {num_files_found}"
-                )
-        else:
-            logger.info(f"## Fallback - Manually Getting Files (for S3 URI): '{s3_uri_full}'")
-            s3_uri = (s3_uri_prefix if s3_uri_prefix[-1] != "/" else s3_uri_prefix[:-1]).rsplit(sep="/", maxsplit=3)
-            bucket_name = s3_uri[0].replace("s3://", "", 1)
-            prefix_path = "/".join(s3_uri[-3:])
-            files = []
-            is_truncated = True
-            next_continuation_token = None
-            while is_truncated:
-                s3_res = s3_list_objects(s3, bucket_name, prefix_path, continuation_token=next_continuation_token)
-                is_truncated = s3_res["IsTruncated"]
-                if "Contents" in s3_res:
-                    files += [
-                        f"{bucket_name}/{i['Key']}"
-                        for i in s3_res["Contents"]
-                        if valid_timestamp(i, latest_start_time, data_service, file_meta_reader)
-                    ]
-                if is_truncated and "NextContinuationToken" in s3_res:
-                    next_continuation_token = s3_res["NextContinuationToken"]
-            logger.info(f"## Files: '{files}'")
-            num_files_found = len(files)
-            logger.info(f"## Manual reading (for data service: '{data_service}'), found: {num_files_found}")
-
-        if num_files_found < num_files_required:
-            s3fs_.invalidate_cache(path=s3_uri_prefix)
-            logger.info(
-                f"## Did NOT find the expected {num_files_required} files (for data service: '{data_service}') ..."
-            )
-            return status_failed(event)
-        data_service_files[data_service] = files
+            data_service_files[futures[future]] = files
+    data_service_files = {data_service: data_service_files[data_service] for data_service in data_service_s3_uri_props}
 
-    set_latest_available_start_times(ssm, new_latest_available_start_times)
+    if not set_latest_available_start_times(new_latest_available_start_times, latest_available_start_times_version):
+        logger.info("## The latest available start times were changed by a concurrent execution ...")
+        return status_failed(event)
 
     logger.info(f"## Data service files: '{data_service_files}'")
 
@@ -250,3 +775,69 @@ def lambda_handler(event, context):
             "csa_timestamp": event[os.environ[EVENT_META_KEY]]["csa_timestamp"],
         },
     }
+
+
+# S3 object created event notifications (via SQS, or SNS) entry point: sets the arrival of each new file of the sat data
+# bucket, in the arrival bitmap of its start time and data service.
+def arrival_handler(event, context):
+    env_keys = {SOURCE_NAME, SAT_DATA_SERVICES, LATEST_AVAILABLE_PARAMETER, FILENAMES_INFO}
+    if not all(k in os.environ for k in env_keys):
+        logger.error(f"## One or more of {env_keys} is not set in ENVIRONMENT VARIABLES: {os.environ}")
+        sys.exit(1)
+    if (backend := os.getenv(STATE_STORE_BACKEND, state_store_backend_default)) not in state_store_backends:
+        logger.error(f"## The state store backend '{backend}' is not one of: {list(state_store_backends)}")
+        sys.exit(1)
+    if backend not in arrival_state_store_backends:
+        # E.g. SSM would lose concurrent arrivals (no conditional overwrite), and never expire the arrival states.
+        logger.error(f"## The arrival states need a state store backend of: {sorted(arrival_state_store_backends)}")
+        sys.exit(1)
+
+    logger.info(f"## EVENT: {event}")
+
+    sat_data_services: dict[str, dict] = dict(json.loads(os.environ[SAT_DATA_SERVICES]))
+
+    arrivals: dict[str, int] = {}
+    arrival_msg_ids: dict[str, set[str]] = {}
+    failed_msg_ids: list[str] = []
+    for record in event.get("Records", []):
+        msg_id: str = record.get("messageId") or record.get("Sns", {}).get("MessageId")
+        record_arrivals: dict[str, int] = {}
+        try:
+            for s3_record in get_notification_s3_records(record):
+                if not str(s3_record.get("eventName", "")).startswith("ObjectCreated:"):
+                    continue
+                obj_key = urllib.parse.unquote_plus(s3_record["s3"]["object"]["key"])
+                obj_key_parts = obj_key.rsplit(sep="/", maxsplit=3)
+                if len(obj_key_parts) < 3 or obj_key_parts[-3] != os.environ[SOURCE_NAME]:
+                    logger.info(f"## Skipping (Not a file of source: '{os.environ[SOURCE_NAME]}'): '{obj_key}'")
+                    continue
+                if (data_service := obj_key_parts[-2]) not in sat_data_services:
+                    logger.info(f"## Skipping (Not a file of a data service): '{obj_key}'")
+                    continue
+                start_timestamp = get_start_timestamp(os.environ[SOURCE_NAME], data_service, obj_key)
+                segment = get_segment(sat_data_services[data_service], obj_key)
+                if start_timestamp is None or segment is None or segment < 1:
+                    logger.info(f"## Skipping (No start time, or (1-based) segment, found): '{obj_key}'")
+                    continue
+                arrival_state_name = get_arrival_state_name(data_service, str(start_timestamp))
+                record_arrivals[arrival_state_name] = record_arrivals.get(arrival_state_name, 0) | 1 << (segment - 1)
+        except (AttributeError, KeyError, TypeError, ValueError) as ex:
+            logger.error(f"## Could NOT read the S3 event notification records ({ex}): '{msg_id}'")
+            failed_msg_ids.append(msg_id)
+            continue
+        # Only the arrivals of a fully read message are set, a malformed message is retried as a whole.
+        for arrival_state_name, arrivals_bitmap in record_arrivals.items():
+            arrivals[arrival_state_name] = arrivals.get(arrival_state_name, 0) | arrivals_bitmap
+            arrival_msg_ids.setdefault(arrival_state_name, set()).add(msg_id)
+
+    for arrival_state_name, arrivals_bitmap in arrivals.items():
+        try:
+            arrivals_set = set_arrivals(arrival_state_name, arrivals_bitmap)
+        except (BotoCoreError, ClientError, OSError) as ex:
+            # E.g. DynamoDB throttling, only fails the messages of this arrival state (for a retry).
+            logger.error(f"## Could NOT set the arrivals ({arrivals_bitmap:b}) of '{arrival_state_name}': {ex}")
+            arrivals_set = False
+        if not arrivals_set:
+            failed_msg_ids += sorted(arrival_msg_ids[arrival_state_name])
+
+    return {batch_item_failures_str: [{item_identifier_str: i} for i in dict.fromkeys(failed_msg_ids)]}
@@ -1,10 +1,16 @@
+import fcntl
 import json
 import logging
 import os
+import re
 import sys
-from datetime import datetime
-
-import urllib3
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime
+from functools import lru_cache
 
 if "LAMBDA_TASK_ROOT" in os.environ:
     sys.path.insert(0, os.environ["LAMBDA_TASK_ROOT"])
@@ -28,44 +34,211 @@ SOURCE_NAME = "SOURCE_NAME"
 SAT_DATA_SERVICES = "SAT_DATA_SERVICES"
 LATEST_START_TIME_PARAMETER = "LATEST_START_TIME_PARAMETER"
 FILENAMES_INFO = "FILENAMES_INFO"
+LISTING_CACHE_TTL = "LISTING_CACHE_TTL"
+TIMESTAMP_INDEX_ENABLED = "TIMESTAMP_INDEX_ENABLED"
+STATE_STORE_BACKEND = "STATE_STORE_BACKEND"
+STATE_STORE_CACHE_TTL = "STATE_STORE_CACHE_TTL"
+STATE_STORE_DIR = "STATE_STORE_DIR"
+STATE_STORE_TABLE = "STATE_STORE_TABLE"
 
 status_str = "status"
 event_str = "event"
 
 age_cut_off: int = 60  # 60 minutes
-
-http = urllib3.PoolManager()
+timestamp_index_str = "_index"
+timestamp_index_filename_ext = "timestamps"
+timestamp_index_typecode = "q"  # Sorted 64-bit ints, of the start times (e.g. 202305101200), of a data service.
+listing_cache_ttl_default: int = 3600  # 1 hour, after which a data service prefix is listed in full again.
+start_timestamp_cache_size: int = 2**17  # Object keys, of which the start timestamps are memoised.
+state_store_backend_default = "ssm"
+state_store_cache_ttl_default: int = 60  # 1 minute, after which a state is read from the state store again.
+state_store_dir_default = "/tmp/state_store"  # For the local file state store backend.
+
+# The last listed key, and the valid timestamps found so far, of each data service prefix (kept between warm
+# invocations), so that each listing resumes after the last listed key, instead of listing the whole prefix.
+listing_cache: dict[str, dict] = {}
+
+# The read cache of the state store (kept between warm invocations), of the time read, value and version of each name.
+state_store_cache: dict[str, tuple[float, dict, int]] = {}
+
+# The state store backend clients (kept between warm invocations), created on first use.
+state_store_clients: dict = {}
+
+# The FileMetaReader (kept between warm invocations), created on first use.
+file_meta_reader: FileMetaReader = None
+
+# The fast path start timestamp parsers, by source name prefix, each of a compiled regex for the filenames of the
+# source, and a function to get the start timestamp (e.g. 202305101200) from the regex match.
+fast_path_start_timestamp_parsers: dict[str, tuple[re.Pattern, callable]] = {
+    "goes": (
+        re.compile(r"OR_ABI-[\w-]+_G\d{2}_s(\d{4})(\d{3})(\d{4})\d*_e\d+_c\d+\.nc"),
+        lambda m: int(date.fromordinal(date(int(m[1]), 1, 1).toordinal() + int(m[2]) - 1).strftime("%Y%m%d") + m[3]),
+    ),
+    "himawari": (
+        re.compile(r"HS_H\d{2}_(\d{8})_(\d{4})_B\d{2}_\w+\.DAT(?:\.bz2)?"),
+        lambda m: int(m[1] + m[2]),
+    ),
+}
+
+# Whether the fast path start timestamp parser of each (source name, data service) agrees with the FileMetaReader,
+# as checked on the first filename it matches (kept between warm invocations).
+fast_path_start_timestamp_checks: dict[tuple[str, str], bool] = {}
+
+
+def get_latest_start_times_old() -> tuple[dict, int]:
+    logger.info("## Getting latest start time (old)")
+    return get_states([os.environ[LATEST_START_TIME_PARAMETER]])[os.environ[LATEST_START_TIME_PARAMETER]]
+
+
+def get_file_meta_reader() -> FileMetaReader:
+    global file_meta_reader  # pylint: disable=global-statement
+    if file_meta_reader is None:
+        settings = FileMetaReaderSettings()
+        logger.info(f"## FileMetaReaderSettings: '{settings.filenames_info}'")
+        file_meta_reader = FileMetaReader(settings)
+    return file_meta_reader
+
+
+# Get the start timestamp (e.g. 202305101200) of an S3 object, or None if the object is not a file of the data
+# service. Known filename shapes are parsed by the fast path parser of the source, and anything else by the
+# FileMetaReader. Memoised by object key, so the keys of a prefix are only parsed once per container.
+@lru_cache(maxsize=start_timestamp_cache_size)
+def get_start_timestamp(source_name: str, data_service: str, obj_key: str) -> int:
+    filename = obj_key.rsplit(sep="/", maxsplit=1)[-1]
+    check_key = (source_name, data_service)
+    for source_name_prefix, (pattern, get_timestamp) in fast_path_start_timestamp_parsers.items():
+        if (
+            source_name.startswith(source_name_prefix)
+            and fast_path_start_timestamp_checks.get(check_key, True)
+            and (match := pattern.fullmatch(filename))
+        ):
+            timestamp = get_timestamp(match)
+            if check_key in fast_path_start_timestamp_checks:
+                return timestamp
+            reader_timestamp = get_start_timestamp_reader(source_name, data_service, obj_key)
+            fast_path_start_timestamp_checks[check_key] = timestamp == reader_timestamp
+            if not fast_path_start_timestamp_checks[check_key]:
+                logger.warning(
+                    f"## Disabled the fast path start timestamp parser (for data service: '{data_service}'), "
+                    f"as it got '{timestamp}' instead of '{reader_timestamp}' for: '{obj_key}'"
+                )
+            return reader_timestamp
+    return get_start_timestamp_reader(source_name, data_service, obj_key)
 
 
-def get_latest_start_times_old(ssm) -> dict:
-    logger.info("## Getting latest start time (old)")
-    return json.loads(ssm.get_parameter(Name=os.environ[LATEST_START_TIME_PARAMETER])["Parameter"]["Value"])
+def get_start_timestamp_reader(source_name: str, data_service: str, obj_key: str) -> int:
+    meta = get_file_meta_reader().find_filename_meta(source_name, obj_key, file_types=[data_service])
+    logger.debug(f"## File Meta: '{meta}'")
+    return int(meta["start_time"].strftime("%Y%m%d%H%M")) if meta is not None else None
 
 
-def get_valid_timestamps(s3, data_service: str, latest_start_time_old: str, reader: FileMetaReader) -> list[int]:
+# Get the timestamp index (written by the Poll stage) of a data service, or None if there is no timestamp index.
+def get_timestamp_index(s3, data_service: str) -> array:
+    bucket_name: str = os.environ[S3_SAT_DATA_BUCKET_NAME]
+    obj_key = (
+        f"{os.environ[SAT_DATA_ORG]}/{os.environ[SOURCE_NAME]}/{timestamp_index_str}/"
+        f"{data_service}.{timestamp_index_filename_ext}"
+    )
+    logger.info(f"## Getting timestamp index: 's3://{bucket_name}/{obj_key}'")
+    try:
+        s3_res = s3.get_object(Bucket=bucket_name, Key=obj_key, ExpectedBucketOwner=os.environ[ACCOUNT_OWNER_ID])
+    except s3.exceptions.NoSuchKey:
+        logger.info(f"## No timestamp index found: 's3://{bucket_name}/{obj_key}'")
+        return None
+    timestamp_index = array(timestamp_index_typecode)
+    try:
+        timestamp_index.frombytes(s3_res["Body"].read())
+    except ValueError as ex:
+        logger.error(f"## Ignoring the corrupt timestamp index ({ex}): 's3://{bucket_name}/{obj_key}'")
+        return None
+    return timestamp_index
+
+
+def get_valid_timestamps(s3, data_service: str, latest_start_time_old: str, cancelled: threading.Event = None) -> array:
     bucket_name: str = os.environ[S3_SAT_DATA_BUCKET_NAME]
     prefix_path: str = f"{os.environ[SAT_DATA_ORG]}/{os.environ[SOURCE_NAME]}/{data_service}"
+    if json.loads(os.getenv(TIMESTAMP_INDEX_ENABLED, "false").lower()) and (
+        (timestamp_index := get_timestamp_index(s3, data_service)) is not None
+    ):
+        # The timestamp index is sorted, so the start times newer than the old latest start time are a single slice.
+        valid_timestamps = timestamp_index[bisect_right(timestamp_index, int(latest_start_time_old)) :]
+        return valid_timestamps if valid_timestamps else None
     logger.info(f"## Getting new latest start time: '{bucket_name}/{prefix_path}'")
+    listing_cache_key = f"{bucket_name}/{prefix_path}"
+    listing_cache_ttl = int(os.getenv(LISTING_CACHE_TTL, str(listing_cache_ttl_default)))
+    start_after = None
+    valid_timestamps = array(timestamp_index_typecode)
+    listing = listing_cache.get(listing_cache_key)
+    if listing and time.monotonic() - listing["listed_at"] < listing_cache_ttl:
+        start_after = listing["start_after"]
+        cached_timestamps: array = listing["timestamps"]
+        valid_timestamps = cached_timestamps[bisect_right(cached_timestamps, int(latest_start_time_old)) :]
+        logger.info(f"## Resuming listing after: '{start_after}' (cached valid timestamps: {len(valid_timestamps)})")
+    else:
+        listing = {"listed_at": time.monotonic()}
+    last_key = start_after
+    for page_last_key, page_valid_timestamps in iter_valid_timestamps(
+        s3, bucket_name, prefix_path, start_after, latest_start_time_old, data_service
+    ):
+        if cancelled is not None and cancelled.is_set():
+            logger.info(f"## Cancelled getting new latest start time: '{bucket_name}/{prefix_path}'")
+            return None
+        valid_timestamps.extend(page_valid_timestamps)
+        last_key = page_last_key
+    valid_timestamps = sorted_unique(valid_timestamps)
+    if listing_cache_ttl > 0:
+        listing_cache[listing_cache_key] = {**listing, "start_after": last_key, "timestamps": valid_timestamps}
+    return valid_timestamps if valid_timestamps else None
+
+
+# Get the latest timestamp common to all the (sorted) valid timestamps, by a sorted-merge intersection from the
+# newest timestamps down, which works for any number of data services.
+def get_latest_common_valid_timestamp(valid_timestamps_list: list[array]) -> int:
+    indexes = [len(i) for i in valid_timestamps_list]
+    while all(indexes):
+        candidate = min(i[j - 1] for i, j in zip(valid_timestamps_list, indexes))
+        # Move each index to just after the newest timestamp not newer than the candidate.
+        indexes = [bisect_right(i, candidate, 0, j) for i, j in zip(valid_timestamps_list, indexes)]
+        if all(j and i[j - 1] == candidate for i, j in zip(valid_timestamps_list, indexes)):
+            return candidate
+        # Exclude the candidate from the data services which do have it, as it is not common to all of them.
+        indexes = [j - 1 if j and i[j - 1] == candidate else j for i, j in zip(valid_timestamps_list, indexes)]
+    return None
+
+
+# Stream the valid timestamps (newer than the old latest start time) of each page of S3 objects in a prefix, along
+# with the last listed key of the page.
+def iter_valid_timestamps(
+    s3,
+    bucket_name: str,
+    prefix_path: str,
+    start_after: str,
+    latest_start_time_old: str,
+    data_service: str,
+):
     is_truncated = True
     next_continuation_token = None
-    valid_timestamps = set()
     while is_truncated:
-        s3_res = s3_list_objects(s3, bucket_name, prefix_path, continuation_token=next_continuation_token)
+        s3_res = s3_list_objects(
+            s3, bucket_name, prefix_path, continuation_token=next_continuation_token, start_after=start_after
+        )
         is_truncated = s3_res["IsTruncated"]
         if "Contents" in s3_res:
-            valid_timestamps = valid_timestamps.union(
-                {
+            yield s3_res["Contents"][-1]["Key"], array(
+                timestamp_index_typecode,
+                (
                     timestamp
                     for i in s3_res["Contents"]
-                    if (timestamp := valid_timestamp(i, latest_start_time_old, data_service, reader))
-                }
+                    if (timestamp := valid_timestamp(i, latest_start_time_old, data_service))
+                ),
             )
         if is_truncated and "NextContinuationToken" in s3_res:
             next_continuation_token = s3_res["NextContinuationToken"]
-    return list(valid_timestamps) if valid_timestamps else None
 
 
-def s3_list_objects(s3, bucket_name: str, prefix_path: str, continuation_token: str = None) -> dict:
+def s3_list_objects(
+    s3, bucket_name: str, prefix_path: str, continuation_token: str = None, start_after: str = None
+) -> dict:
     logger.info(f"## Listing S3 objects in: s3://{bucket_name}/{prefix_path}")
     list_objects_v2_kwargs = {
         k: v
@@ -75,6 +248,7 @@ def s3_list_objects(s3, bucket_name: str, prefix_path: str, continuation_token:
             "Prefix": prefix_path,
             "ExpectedBucketOwner": os.environ[ACCOUNT_OWNER_ID],
             "ContinuationToken": continuation_token if continuation_token else None,
+            "StartAfter": start_after if start_after else None,
         }.items()
         if v
     }
@@ -83,20 +257,157 @@ def s3_list_objects(s3, bucket_name: str, prefix_path: str, continuation_token:
     return s3_res
 
 
-def set_latest_start_times(ssm, latest_start_times_new: dict[str, str]) -> None:
-    logger.info(f"## Setting the new latest start time SSM parameter to: '{latest_start_times_new}'")
-    ssm_res = ssm.put_parameter(
-        Name=os.environ[LATEST_START_TIME_PARAMETER],
-        # Description,  # Default to the existing description
-        Value=json.dumps(latest_start_times_new),
-        Type="String",
-        Overwrite=True,
-        # TODO: (OPTIONAL) A regular expression used to validate the parameter value.
-        # AllowedPattern=,
-        Tier="Standard",
-        DataType="text",
+def set_latest_start_times(latest_start_times_new: dict[str, str], version: int) -> bool:
+    logger.info(f"## Setting the new latest start time to: '{latest_start_times_new}'")
+    return set_state(os.environ[LATEST_START_TIME_PARAMETER], latest_start_times_new, version)
+
+
+def sorted_unique(timestamps: array) -> array:
+    return array(timestamp_index_typecode, sorted(set(timestamps)))
+
+
+def get_state_store_client():
+    if (backend := os.getenv(STATE_STORE_BACKEND, state_store_backend_default)) not in state_store_clients:
+        state_store_clients[backend] = boto3.client(backend, region_name=os.environ["AWS_REGION"])
+    return state_store_clients[backend]
+
+
+def get_state_store_file_path(name: str) -> str:
+    return os.path.join(
+        os.getenv(STATE_STORE_DIR, state_store_dir_default), f"{name.strip('/').replace('/', '_')}.json"
     )
+
+
+# Get the states (each of a value and a version) of one or more names, from the in-process read cache, or else in a
+# batch from the state store backend. A name without a state has an empty value, and version 0.
+def get_states(names: list[str]) -> dict[str, tuple[dict, int]]:
+    state_store_cache_ttl = int(os.getenv(STATE_STORE_CACHE_TTL, str(state_store_cache_ttl_default)))
+    now = time.monotonic()
+    states = {
+        name: (cached[1], cached[2])
+        for name in names
+        if (cached := state_store_cache.get(name)) and now - cached[0] < state_store_cache_ttl
+    }
+    if names_uncached := [name for name in names if name not in states]:
+        backend = os.getenv(STATE_STORE_BACKEND, state_store_backend_default)
+        logger.info(f"## Getting states (from state store: '{backend}'): {names_uncached}")
+        for name, (value, version) in state_store_backends[backend][0](names_uncached).items():
+            state_store_cache[name] = (now, value, version)
+            states[name] = (value, version)
+    return states
+
+
+# Set the state of a name, only if its version is still the version the value was based on (compare-and-set, except
+# in the SSM backend, see 'ssm_set_state'). Returns False, and drops the name from the read cache, if the state was
+# changed by someone else in the meantime.
+def set_state(name: str, value: dict, version: int) -> bool:
+    backend = os.getenv(STATE_STORE_BACKEND, state_store_backend_default)
+    logger.info(f"## Setting state (in state store: '{backend}') of '{name}' (version: {version}) to: '{value}'")
+    if not (version_new := state_store_backends[backend][1](name, value, version)):
+        logger.info(f"## State (in state store: '{backend}') of '{name}' is no longer version: {version}")
+        state_store_cache.pop(name, None)
+        return False
+    state_store_cache[name] = (time.monotonic(), value, version_new)
+    return True
+
+
+def dynamodb_get_states(names: list[str]) -> dict[str, tuple[dict, int]]:
+    dynamodb = get_state_store_client()
+    table_name: str = os.environ[STATE_STORE_TABLE]
+    states = {name: ({}, 0) for name in names}
+    request_items = {table_name: {"Keys": [{"name": {"S": name}} for name in names], "ConsistentRead": True}}
+    while request_items:
+        dynamodb_res = dynamodb.batch_get_item(RequestItems=request_items)
+        logger.debug(f"## DynamoDB Batch Get Item response: {dynamodb_res}")
+        for item in dynamodb_res["Responses"].get(table_name, []):
+            states[item["name"]["S"]] = (json.loads(item["value"]["S"]), int(item["version"]["N"]))
+        request_items = dynamodb_res.get("UnprocessedKeys")
+    return states
+
+
+def dynamodb_set_state(name: str, value: dict, version: int) -> int:
+    dynamodb = get_state_store_client()
+    try:
+        dynamodb.put_item(
+            TableName=os.environ[STATE_STORE_TABLE],
+            Item={"name": {"S": name}, "value": {"S": json.dumps(value)}, "version": {"N": str(version + 1)}},
+            ConditionExpression="attribute_not_exists(#name)" if not version else "#version = :version",
+            ExpressionAttributeNames={"#name": "name"} if not version else {"#version": "version"},
+            **({"ExpressionAttributeValues": {":version": {"N": str(version)}}} if version else {}),
+        )
+    except dynamodb.exceptions.ConditionalCheckFailedException:
+        return 0
+    return version + 1
+
+
+def file_get_states(names: list[str]) -> dict[str, tuple[dict, int]]:
+    states = {}
+    for name in names:
+        try:
+            with open(get_state_store_file_path(name), encoding="utf-8") as f:
+                state = json.load(f)
+            states[name] = (state["value"], state["version"])
+        except FileNotFoundError:
+            states[name] = ({}, 0)
+    return states
+
+
+def file_set_state(name: str, value: dict, version: int) -> int:
+    file_path = get_state_store_file_path(name)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(f"{file_path}.lock", "w", encoding="utf-8") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        if file_get_states([name])[name][1] != version:
+            return 0
+        with open(f"{file_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump({"value": value, "version": version + 1}, f)
+        os.replace(f"{file_path}.tmp", file_path)
+    return version + 1
+
+
+def ssm_get_states(names: list[str]) -> dict[str, tuple[dict, int]]:
+    ssm = get_state_store_client()
+    states = {name: ({}, 0) for name in names}
+    for i in range(0, len(names), 10):  # Up to 10 names per request
+        ssm_res = ssm.get_parameters(Names=names[i : i + 10])
+        logger.info(f"## SSM Get Parameters response: {ssm_res}")
+        for parameter in ssm_res["Parameters"]:
+            states[parameter["Name"]] = (json.loads(parameter["Value"]), parameter["Version"])
+    return states
+
+
+def ssm_set_state(name: str, value: dict, version: int) -> int:
+    ssm = get_state_store_client()
+    # SSM has no conditional overwrite (only a conditional create), so the version is only checked before the
+    # overwrite. A concurrent write in between is NOT detected: the last writer wins (and is the one that succeeds),
+    # so use the DynamoDB backend wherever concurrent writers must not lose each other's updates.
+    if version and ssm_get_states([name])[name][1] != version:
+        return 0
+    try:
+        ssm_res = ssm.put_parameter(
+            Name=name,
+            # Description,  # Default to the existing description
+            Value=json.dumps(value),
+            Type="String",
+            Overwrite=bool(version),
+            # TODO: (OPTIONAL) A regular expression used to validate the parameter value.
+            # AllowedPattern=,
+            Tier="Standard",
+            DataType="text",
+        )
+    except ssm.exceptions.ParameterAlreadyExists:
+        return 0
     logger.info(f"## SSM Put Parameter response: {ssm_res}")
+    return ssm_res["Version"]
+
+
+# The state store backends, each of a batched get states function, and a set state function (returning the new version,
+# or 0 if the state is no longer the version). Only the DynamoDB and file backends compare-and-set.
+state_store_backends: dict[str, tuple[callable, callable]] = {
+    "dynamodb": (dynamodb_get_states, dynamodb_set_state),
+    "file": (file_get_states, file_set_state),
+    "ssm": (ssm_get_states, ssm_set_state),
+}
 
 
 def status_failed(responses: dict, msg: str) -> dict:
@@ -104,19 +415,16 @@ def status_failed(responses: dict, msg: str) -> dict:
     return {status_str: "FAILED", "msg": msg, event_str: responses}
 
 
-def valid_timestamp(i, latest_start_time_old: str, data_service: str, reader: FileMetaReader) -> int:
+def valid_timestamp(i, latest_start_time_old: str, data_service: str) -> int:
     obj_key = i["Key"]
     logger.debug(
         f"## Checking for valid timestamp: '{obj_key}' (data service: '{data_service}', "
         f"old latest start time: '{latest_start_time_old}')"
     )
-    meta = reader.find_filename_meta(os.environ[SOURCE_NAME], obj_key, file_types=[data_service])
-    logger.debug(f"## File Meta: '{meta}'")
-    if meta is not None:
-        timestamp = meta["start_time"].strftime("%Y%m%d%H%M")
-        logger.debug(f"## Timestamp: '{timestamp}'")
-        if int(timestamp) > int(latest_start_time_old):
-            return timestamp
+    timestamp = get_start_timestamp(os.environ[SOURCE_NAME], data_service, obj_key)
+    logger.debug(f"## Timestamp: '{timestamp}'")
+    if timestamp is not None and timestamp > int(latest_start_time_old):
+        return timestamp
     return None
 
 
@@ -134,43 +442,54 @@ def lambda_handler(event, context):
     if not all(k in os.environ for k in env_keys):
         logger.error(f"## One or more of {env_keys} is not set in ENVIRONMENT VARIABLES: {os.environ}")
         sys.exit(1)
+    if (backend := os.getenv(STATE_STORE_BACKEND, state_store_backend_default)) not in state_store_backends:
+        logger.error(f"## The state store backend '{backend}' is not one of: {list(state_store_backends)}")
+        sys.exit(1)
 
     logger.info(f"## EVENT: {event}")
 
     s3 = boto3.client("s3", region_name=os.environ["AWS_REGION"])
-    ssm = boto3.client("ssm", region_name=os.environ["AWS_REGION"])
-    logger.info("## Connected to S3 and SSM via client")
+    logger.info("## Connected to S3 via client")
 
-    latest_start_times: dict[str, str] = get_latest_start_times_old(ssm)
+    latest_start_times, latest_start_times_version = get_latest_start_times_old()
 
     sat_data_services = [k for k, _ in dict(json.loads(os.environ[SAT_DATA_SERVICES])).items()]
 
-    valid_timestamps_list: list[tuple[str, list[int]]] = []
-    settings = FileMetaReaderSettings()
-    logger.info(f"## FileMetaReaderSettings: '{settings.filenames_info}'")
-    file_meta_reader = FileMetaReader(settings)
-    for data_service in sat_data_services:
-        valid_timestamps = get_valid_timestamps(
-            s3,
-            data_service,
-            latest_start_times[data_service] if data_service in latest_start_times else "0",
-            file_meta_reader,
+    get_file_meta_reader()
+
+    # Discover the valid timestamps of each data service concurrently, cancelling the remaining discovery as soon as
+    # one data service has no new files (as then there cannot be a new latest common valid timestamp).
+    data_service_valid_timestamps: dict[str, array] = {}
+    cancelled = threading.Event()
+    with ThreadPoolExecutor(max_workers=len(sat_data_services)) as executor:
+        futures = {
+            executor.submit(
+                get_valid_timestamps,
+                s3,
+                data_service,
+                latest_start_times[data_service] if data_service in latest_start_times else "0",
+                cancelled,
+            ): data_service
+            for data_service in sat_data_services
+        }
+        for future in as_completed(futures):
+            data_service = futures[future]
+            if (valid_timestamps := future.result()) is None:
+                cancelled.set()
+                for f in futures:
+                    f.cancel()
+                return status_failed(
+                    event,
+                    f"## Could NOT find any files newer than: '{latest_start_times.get(data_service, '0')}' (for data service: '{data_service}')",
+                )
+            data_service_valid_timestamps[data_service] = valid_timestamps
+    if (
+        latest_common_valid_timestamp_int := get_latest_common_valid_timestamp(
+            [data_service_valid_timestamps[data_service] for data_service in sat_data_services]
         )
-        if valid_timestamps is None:
-            return status_failed(
-                event,
-                f"## Could NOT find any files newer than: '{latest_start_times[data_service]}' (for data service: '{data_service}')",
-            )
-        valid_timestamps_list.append((data_service, valid_timestamps))
-
-    if len(valid_timestamps_list) > 1:
-        if not (common_valid_timestamps := set(valid_timestamps_list[0][1]).intersection(valid_timestamps_list[1][1])):
-            return status_failed(
-                event, f"## Could NOT find any common valid timestamps newer than: '{latest_start_times}'"
-            )
-        latest_common_valid_timestamp: str = str(sorted(list(common_valid_timestamps))[-1])
-    else:
-        latest_common_valid_timestamp: str = str(sorted(valid_timestamps_list[0][1])[-1])
+    ) is None:
+        return status_failed(event, f"## Could NOT find any common valid timestamps newer than: '{latest_start_times}'")
+    latest_common_valid_timestamp: str = str(latest_common_valid_timestamp_int)
 
     logger.info(f"## Latest common valid timestamp: '{latest_common_valid_timestamp}'")
 
@@ -192,7 +511,13 @@ def lambda_handler(event, context):
             f"## The new latest common valid timestamp would've been older than {age_cut_off} minutes: '{latest_common_valid_timestamp}'",
         )
 
-    set_latest_start_times(ssm, {data_service: latest_common_valid_timestamp for data_service in sat_data_services})
+    if not set_latest_start_times(
+        {data_service: latest_common_valid_timestamp for data_service in sat_data_services}, latest_start_times_version
+    ):
+        return status_failed(
+            event,
+            f"## The old latest start times: '{latest_start_times}', were changed by a concurrent execution",
+        )
 
     return {
         status_str: "SUCCEEDED",
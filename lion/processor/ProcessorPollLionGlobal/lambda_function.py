@@ -1,7 +1,12 @@
 import json
 import logging
 import os
+import re
 import sys
+import time
+import urllib.parse
+from array import array
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta, timezone
 
 if "LAMBDA_TASK_ROOT" in os.environ:
@@ -9,7 +14,8 @@ if "LAMBDA_TASK_ROOT" in os.environ:
 
 # pylint: disable=wrong-import-position
 import boto3
-from botocore.exceptions import ClientError
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
 
 logger = logging.getLogger()
 # logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)  # Enable to log to stdout, and comment line below.
@@ -22,40 +28,475 @@ BUCKET_NAME_DEST = "BUCKET_NAME_DEST"
 SAT_DATA_ORG = "SAT_DATA_ORG"
 SOURCE_NAME = "SOURCE_NAME"
 SAT_DATA_SERVICES = "SAT_DATA_SERVICES"
+MAX_WORKERS = "MAX_WORKERS"
+DEST_KEY_INDEX_CACHE_ENABLED = "DEST_KEY_INDEX_CACHE_ENABLED"
+WATERMARK_PARAMETER = "WATERMARK_PARAMETER"
+MAX_CATCH_UP_HOURS = "MAX_CATCH_UP_HOURS"
+TIME_RESERVE_MILLIS = "TIME_RESERVE_MILLIS"
+TIMESTAMP_INDEX_ENABLED = "TIMESTAMP_INDEX_ENABLED"
+TIMESTAMP_INDEX_RETENTION_DAYS = "TIMESTAMP_INDEX_RETENTION_DAYS"
+
+status_str = "status"
+responses_str = "responses"
+
+moved_str = "MOVED"
+skipped_str = "SKIPPED"
+failed_str = "FAILED"
+
+batch_item_failures_str = "batchItemFailures"
+item_identifier_str = "itemIdentifier"
+
+max_workers_default: int = 32
+copy_object_max_size: int = 5 * 1024**3  # 5 GiB, the largest S3 object a single CopyObject request can copy.
+max_catch_up_hours_default: int = 24  # The max number of hours to catch up on sat data for (from the watermark).
+time_reserve_millis_default: int = 30000  # The invocation time to keep in reserve, when catching up on sat data.
+timestamp_index_retention_days_default: int = 7  # The number of days of start times to keep in a timestamp index.
+timestamp_index_max_attempts: int = 5  # The max number of attempts to update a timestamp index (if written to).
+timestamp_index_str = "_index"
+timestamp_index_filename_ext = "timestamps"
+timestamp_index_typecode = "q"  # Sorted 64-bit ints, of the start times (e.g. 202305101200), of a data service.
 
 sat_data_source_folder = "folder"
 sat_data_source_filter = "filter"
+sat_data_source_filename_prefix = "filename-prefix"
 padding_day_of_year = 3
 padding_hour = 2
+hours_to_check: int = 2  # The number of hours to check sat data for, when there is no watermark.
+hours_to_check_himawari: int = 1  # The number of hours to check Himawari sat data for, when there is no watermark.
+
+# Dest obj keys known to already exist (by sat data service), kept between warm invocations.
+dest_key_index_cache: dict[str, set[str]] = {}
+
+
+# Get the filename prefix (of the sat data filenames in a source prefix), using the naming convention of the source,
+# so that the S3 listing only returns matching S3 objects. Falls back to an empty filename prefix (list everything
+# in the source prefix, and filter afterwards) for sources, or filters, whose naming convention is not known.
+def get_obj_filename_prefix(sat_data_service_meta: dict, dt: datetime) -> str:
+    if sat_data_source_filename_prefix in sat_data_service_meta:
+        # Explicit filename prefix (a strftime format) in the sat data service meta, or None to disable narrowing.
+        return (
+            dt.strftime(filename_prefix)
+            if (filename_prefix := sat_data_service_meta[sat_data_source_filename_prefix])
+            else ""
+        )
+    folder: str = sat_data_service_meta[sat_data_source_folder]
+    filter_: str = sat_data_service_meta.get(sat_data_source_filter)
+    source_name: str = os.environ[SOURCE_NAME]
+    if source_name.startswith("goes"):
+        # E.g. 'OR_ABI-L1b-RadF-M6C02_G16_s20231301200205_e20231301209513_c20231301209563.nc'
+        if filter_ is None:
+            return f"OR_{folder}-"
+        if re.fullmatch(r"M\d+(C\d{2})?", filter_):
+            return f"OR_{folder}-{filter_}_"
+    elif source_name.startswith("himawari") and folder.startswith("AHI-L1b-"):
+        # E.g. 'HS_H09_20230510_0000_B03_FLDK_R05_S0101.DAT.bz2'
+        if sat_num := re.search(r"\d+$", source_name):
+            filename_prefix = f"HS_H{sat_num.group().zfill(2)}_{dt.strftime('%Y%m%d_%H%M')}_"
+            if filter_ is None:
+                return filename_prefix
+            if re.fullmatch(r"B\d{2}", filter_):
+                return f"{filename_prefix}{filter_}_"
+    logger.debug(f"## No filename prefix (for sat data service meta: '{sat_data_service_meta}')")
+    return ""
+
 
+def get_obj_prefix_source(obj_prefix_dir: str, sat_data_service_meta: dict, dt: datetime) -> str:
+    if filename_prefix := get_obj_filename_prefix(sat_data_service_meta, dt):
+        return f"{obj_prefix_dir}/{filename_prefix}"
+    return obj_prefix_dir
 
-def get_obj_prefix_sources(sat_data_service_meta: dict) -> list[str]:
-    today = datetime.now(timezone.utc)
+
+# List every (sat data service, source prefix) pair concurrently, merging the listed S3 objects into the candidate
+# copy jobs (dest obj key -> (source obj key, source obj size)) of each sat data service.
+def get_candidate_copy_jobs(
+    s3, sat_data_services: dict[str, dict], sat_data_service_dts: dict[str, list[datetime]], max_workers: int
+) -> dict[str, dict[str, tuple[str, int]]]:
+    sat_data_service_copy_jobs: dict[str, dict[str, tuple[str, int]]] = {k: {} for k in sat_data_service_dts}
+    listings = [
+        (sat_data_service, sat_data_services[sat_data_service], obj_prefix_source)
+        for sat_data_service, obj_prefix_dts in sat_data_service_dts.items()
+        for obj_prefix_source in get_obj_prefix_sources(sat_data_services[sat_data_service], obj_prefix_dts)
+    ]
+    logger.info(f"## Listing source prefixes (count: {len(listings)}, max workers: {max_workers})")
+    if not listings:
+        return sat_data_service_copy_jobs
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(listings))) as executor:
+        futures = {executor.submit(list_candidate_copy_jobs, s3, *listing): listing for listing in listings}
+        for future in as_completed(futures):
+            sat_data_service_copy_jobs[futures[future][0]].update(future.result())
+    return sat_data_service_copy_jobs
+
+
+def get_obj_prefix_interval() -> timedelta:
+    # Himawari sat data is stored in 10 minute folders, all other sat data is stored in hour folders.
+    return timedelta(minutes=10) if os.environ[SOURCE_NAME].startswith("himawari") else timedelta(hours=1)
+
+
+def get_obj_prefix_window() -> timedelta:
+    # The source prefix folders to check (and to catch up on per batch), when there is no watermark.
     if os.environ[SOURCE_NAME].startswith("himawari"):
-        min_interval: int = 10
-        last_timestamp = today.replace(minute=(today.minute // min_interval) * min_interval)
-        obj_prefix_sources: list[str] = [
-            (
-                f"{sat_data_service_meta[sat_data_source_folder]}/"
-                f"{today.strftime('%Y/%m/%d')}/"
-                f"{hours_mins_minus_some_mins.strftime('%H%M')}"
-            )
-            for i in range(int(60 / min_interval))
-            if (hours_mins_minus_some_mins := last_timestamp - timedelta(minutes=i * min_interval))
-        ]
+        return timedelta(hours=hours_to_check_himawari)
+    return timedelta(hours=hours_to_check)
+
+
+def get_obj_prefix_dir(sat_data_service_meta: dict, dt: datetime) -> str:
+    if os.environ[SOURCE_NAME].startswith("himawari"):
+        return f"{sat_data_service_meta[sat_data_source_folder]}/{dt.strftime('%Y/%m/%d')}/{dt.strftime('%H%M')}"
+    return (
+        f"{sat_data_service_meta[sat_data_source_folder]}/"
+        f"{dt.year}/"
+        f"{str(dt.timetuple().tm_yday).zfill(padding_day_of_year)}/"
+        f"{str(dt.hour).zfill(padding_hour)}"
+    )
+
+
+# Get the dest obj key of a source obj key, if the source obj key is in the folder of the sat data service, and
+# passes the filter of the sat data service.
+def get_obj_prefix_dest(sat_data_service: str, sat_data_service_meta: dict, obj_key_source: str) -> str:
+    if not obj_key_source.startswith(f"{sat_data_service_meta[sat_data_source_folder]}/"):
+        return None
+    obj_key = obj_key_source.rsplit(sep="/", maxsplit=1)[-1]
+    if (
+        sat_data_source_filter in sat_data_service_meta
+        and sat_data_service_meta[sat_data_source_filter] is not None
+        and sat_data_service_meta[sat_data_source_filter] not in obj_key
+    ):
+        return None
+    return f"{os.environ[SAT_DATA_ORG]}/{os.environ[SOURCE_NAME]}/{sat_data_service}/{obj_key}"
+
+
+# Get the start time (e.g. 202305101200) of a sat data filename, using the naming convention of the source, or None
+# for sources whose naming convention is not known.
+def get_obj_start_timestamp(obj_key: str) -> int:
+    filename = obj_key.rsplit(sep="/", maxsplit=1)[-1]
+    if os.environ[SOURCE_NAME].startswith("goes"):
+        # E.g. 'OR_ABI-L1b-RadF-M6C02_G16_s20231301200205_e20231301209513_c20231301209563.nc'
+        if start_time := re.search(r"_s(\d{11})\d*_e", filename):
+            return int(datetime.strptime(start_time.group(1), "%Y%j%H%M").strftime("%Y%m%d%H%M"))
+    elif os.environ[SOURCE_NAME].startswith("himawari"):
+        # E.g. 'HS_H09_20230510_0000_B03_FLDK_R05_S0101.DAT.bz2'
+        if start_time := re.match(r"HS_H\d{2}_(\d{8})_(\d{4})_", filename):
+            return int(f"{start_time.group(1)}{start_time.group(2)}")
+    return None
+
+
+# Get the datetime of the source prefix folder, of a source obj key (e.g. 'ABI-L1b-RadF/2023/130/12/...').
+def get_obj_prefix_dt(obj_key_source: str) -> datetime:
+    obj_key_props = obj_key_source.split(sep="/")
+    if os.environ[SOURCE_NAME].startswith("himawari"):
+        dt = datetime.strptime("/".join(obj_key_props[1:5]), "%Y/%m/%d/%H%M")
     else:
-        hours_to_check: int = 2  # The number of hours to check sat data for (from today's available sat data).
-        obj_prefix_sources: list[str] = [
-            (
-                f"{sat_data_service_meta[sat_data_source_folder]}/"
-                f"{today_minus_some_hours.year}/"
-                f"{str(today_minus_some_hours.timetuple().tm_yday).zfill(padding_day_of_year)}/"
-                f"{str(today_minus_some_hours.hour).zfill(padding_hour)}"
+        dt = datetime.strptime("/".join(obj_key_props[1:4]), "%Y/%j/%H")
+    return dt.replace(tzinfo=timezone.utc)
+
+
+# Get the datetimes of the source prefix folders to check (oldest first), from the folder of the watermark (if any)
+# up to now, capped at the max catch up hours. Without a watermark, the last few folders are checked.
+def get_obj_prefix_dts(watermark_dt: datetime = None) -> list[datetime]:
+    interval = get_obj_prefix_interval()
+    interval_mins = int(interval / timedelta(minutes=1))
+    now = datetime.now(timezone.utc)
+    last_dt = now.replace(minute=(now.minute // interval_mins) * interval_mins, second=0, microsecond=0)
+    if watermark_dt is None:
+        first_dt = last_dt - (get_obj_prefix_window() - interval)
+    else:
+        max_catch_up_hours = int(os.getenv(MAX_CATCH_UP_HOURS, str(max_catch_up_hours_default)))
+        # Re-check the folder before the watermark folder too, in case of any late arriving sat data.
+        first_dt = max(watermark_dt - interval, last_dt - timedelta(hours=max_catch_up_hours))
+    return [first_dt + i * interval for i in range(int((last_dt - first_dt) / interval) + 1)]
+
+
+def get_obj_prefix_sources(sat_data_service_meta: dict, obj_prefix_dts: list[datetime]) -> list[str]:
+    return [
+        get_obj_prefix_source(get_obj_prefix_dir(sat_data_service_meta, dt), sat_data_service_meta, dt)
+        for dt in obj_prefix_dts
+    ]
+
+
+# Get the S3 event notification records of an SQS message (or SNS notification), unwrapping any SNS envelope.
+def get_notification_s3_records(record: dict) -> list[dict]:
+    if "Sns" in record:
+        body = json.loads(record["Sns"]["Message"])
+    else:
+        body = json.loads(record["body"])
+        if body.get("Type") == "Notification" and "Message" in body:
+            body = json.loads(body["Message"])
+    # E.g. an 's3:TestEvent' has no records.
+    return body.get("Records", [])
+
+
+def get_s3_client(max_workers: int):
+    # One client shared by all listing and copy workers, with a connection pool large enough for every worker.
+    s3 = boto3.client(
+        "s3", region_name=os.environ["AWS_REGION"], config=Config(max_pool_connections=max(max_workers, 10))
+    )
+    logger.info("## Connected to S3 via client")
+    return s3
+
+
+def get_timestamp_index_key(sat_data_service: str) -> str:
+    return (
+        f"{os.environ[SAT_DATA_ORG]}/{os.environ[SOURCE_NAME]}/{timestamp_index_str}/"
+        f"{sat_data_service}.{timestamp_index_filename_ext}"
+    )
+
+
+# Get the new watermark (the newest copied source obj key) of a sat data service, from its copy jobs. The watermark
+# does not advance past (and moves back to) the oldest failed copy job, so the failed copy is retried.
+def get_watermark_new(
+    candidate_jobs: dict[str, tuple[str, int]], copy_results: dict[str, dict], watermark: str = None
+) -> tuple[str, bool]:
+    if failed_keys_source := [v[0] for k, v in candidate_jobs.items() if copy_results[k][status_str] == failed_str]:
+        return min(failed_keys_source), True
+    if copied_keys_source := [v[0] for k, v in candidate_jobs.items() if copy_results[k][status_str] != failed_str]:
+        return max(copied_keys_source + ([watermark] if watermark else [])), False
+    return watermark, False
+
+
+def get_watermarks(ssm) -> dict[str, str]:
+    logger.info("## Getting watermarks")
+    try:
+        return json.loads(ssm.get_parameter(Name=os.environ[WATERMARK_PARAMETER])["Parameter"]["Value"])
+    except ssm.exceptions.ParameterNotFound:
+        logger.info(f"## No watermarks found: '{os.environ[WATERMARK_PARAMETER]}'")
+        return {}
+
+
+def list_candidate_copy_jobs(
+    s3, sat_data_service: str, sat_data_service_meta: dict, obj_prefix_source: str
+) -> dict[str, tuple[str, int]]:
+    candidate_jobs: dict[str, tuple[str, int]] = {}
+    is_truncated = True
+    next_continuation_token = None
+    while is_truncated:
+        s3_res = s3_list_objects(
+            s3, os.environ[BUCKET_NAME_SOURCE], obj_prefix_source, continuation_token=next_continuation_token
+        )
+        is_truncated = s3_res["IsTruncated"]
+        for obj in s3_res.get("Contents", []):
+            if obj_prefix_dest := get_obj_prefix_dest(sat_data_service, sat_data_service_meta, obj["Key"]):
+                candidate_jobs[obj_prefix_dest] = (obj["Key"], int(obj["Size"]))
+        if is_truncated and "NextContinuationToken" in s3_res:
+            next_continuation_token = s3_res["NextContinuationToken"]
+    return candidate_jobs
+
+
+# Move the S3 objects (in the source prefix folders of each sat data service) which do not already exist in the
+# dest S3 bucket, returning the candidate copy jobs (by sat data service) and the result of each copy job.
+def move_sat_data_objs(
+    s3, sat_data_services: dict[str, dict], sat_data_service_dts: dict[str, list[datetime]], max_workers: int
+) -> tuple[dict[str, dict[str, tuple[str, int]]], dict[str, dict]]:
+    sat_data_service_copy_jobs = get_candidate_copy_jobs(s3, sat_data_services, sat_data_service_dts, max_workers)
+
+    copy_jobs: dict[str, tuple[str, int]] = {}
+    copy_results: dict[str, dict] = {}
+    for sat_data_service, candidate_jobs in sat_data_service_copy_jobs.items():
+        # Only list the dest prefix for candidates not already known (from a warm invocation) to exist.
+        known_keys_dest = dest_key_index_cache.setdefault(sat_data_service, set())
+        if candidate_jobs:
+            # Forget dest obj keys older than this invocation's candidates, so the cache does not grow unbounded.
+            obj_key_dest_min = min(candidate_jobs)
+            known_keys_dest.difference_update({k for k in known_keys_dest if k < obj_key_dest_min})
+        if unknown_keys_dest := set(candidate_jobs).difference(known_keys_dest):
+            known_keys_dest.update(get_dest_key_index(s3, sat_data_service, unknown_keys_dest))
+        for obj_prefix_dest, copy_job in candidate_jobs.items():
+            if obj_prefix_dest in known_keys_dest:
+                logger.info(f"## Skipping (The S3 object already exists): '{obj_prefix_dest}'")
+                copy_results[obj_prefix_dest] = {status_str: skipped_str}
+            else:
+                copy_jobs[obj_prefix_dest] = copy_job
+
+    copy_results.update(s3_copy_objects(s3, copy_jobs, max_workers))
+
+    for sat_data_service, candidate_jobs in sat_data_service_copy_jobs.items():
+        dest_key_index_cache[sat_data_service].update(
+            k for k in candidate_jobs if copy_results[k][status_str] == moved_str
+        )
+
+    return sat_data_service_copy_jobs, copy_results
+
+
+def s3_copy_object(s3, bucket_name_source: str, obj_key_source: str, obj_size: int, obj_key_dest: str) -> dict:
+    copy_source = {"Bucket": bucket_name_source, "Key": obj_key_source}
+    try:
+        if obj_size < copy_object_max_size:
+            # A single server-side request, no need for the managed (HEAD + multipart) copy.
+            s3.copy_object(
+                CopySource=copy_source,
+                Bucket=os.environ[BUCKET_NAME_DEST],
+                Key=obj_key_dest,
+                # ExpectedBucketOwner=os.environ[ACCOUNT_OWNER_ID],  # ONLY use if we own the source S3 bucket.
+                # StorageClass="STANDARD",  # ONLY use if in the destination S3 bucket the new object should have a non-STANDARD storage class
             )
-            for i in range(hours_to_check)
-            if (today_minus_some_hours := today - timedelta(hours=i))
-        ]
-    return obj_prefix_sources
+        else:
+            s3.copy(CopySource=copy_source, Bucket=os.environ[BUCKET_NAME_DEST], Key=obj_key_dest)
+    except ClientError as ex:
+        logger.error(f"## Failed to copy ({ex}): '{obj_key_dest}'")
+        return {status_str: failed_str, "error": str(ex)}
+    logger.info(f"## Moved: 's3://{bucket_name_source}/{obj_key_source}' -> '{obj_key_dest}'")
+    return {status_str: moved_str}
+
+
+# Copy each copy job (dest obj key -> (source obj key, source obj size)) using a bounded thread pool,
+# which shares the one (thread-safe) S3 client, and return the result of each copy job (by dest obj key).
+def s3_copy_objects(s3, copy_jobs: dict[str, tuple[str, int]], max_workers: int) -> dict[str, dict]:
+    logger.info(f"## Copying S3 objects (count: {len(copy_jobs)}, max workers: {max_workers})")
+    copy_results: dict[str, dict] = {}
+    if not copy_jobs:
+        return copy_results
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(copy_jobs))) as executor:
+        futures = {
+            executor.submit(
+                s3_copy_object, s3, os.environ[BUCKET_NAME_SOURCE], obj_key_source, obj_size, obj_key_dest
+            ): obj_key_dest
+            for obj_key_dest, (obj_key_source, obj_size) in copy_jobs.items()
+        }
+        for future in as_completed(futures):
+            obj_key_dest = futures[future]
+            try:
+                copy_results[obj_key_dest] = future.result()
+            except Exception as ex:  # pylint: disable=broad-except
+                logger.error(f"## Failed to copy ({ex}): '{obj_key_dest}'")
+                copy_results[obj_key_dest] = {status_str: failed_str, "error": str(ex)}
+    return copy_results
+
+
+# List the dest obj keys which already exist (for a sat data service), in a single pass over the dest prefix. Only
+# the key range of the candidate dest obj keys is listed, as sat data filenames sort by their start time.
+def get_dest_key_index(s3, sat_data_service: str, obj_keys_dest: set[str]) -> set[str]:
+    dest_key_index: set[str] = set()
+    if not obj_keys_dest:
+        return dest_key_index
+    prefix_path = f"{os.environ[SAT_DATA_ORG]}/{os.environ[SOURCE_NAME]}/{sat_data_service}/"
+    obj_key_dest_min, obj_key_dest_max = min(obj_keys_dest), max(obj_keys_dest)
+    logger.info(f"## Getting dest key index: 's3://{os.environ[BUCKET_NAME_DEST]}/{prefix_path}'")
+    is_truncated = True
+    next_continuation_token = None
+    while is_truncated:
+        s3_res = s3_list_objects(
+            s3,
+            os.environ[BUCKET_NAME_DEST],
+            prefix_path,
+            continuation_token=next_continuation_token,
+            # A prefix sorts before the key itself, so the smallest candidate dest obj key is included.
+            start_after=obj_key_dest_min[:-1],
+            expected_bucket_owner=os.environ[ACCOUNT_OWNER_ID],
+        )
+        is_truncated = s3_res["IsTruncated"]
+        if "Contents" in s3_res:
+            dest_key_index.update(i["Key"] for i in s3_res["Contents"])
+            if s3_res["Contents"][-1]["Key"] >= obj_key_dest_max:
+                break  # Every later dest obj key sorts after all the candidate dest obj keys.
+        if is_truncated and "NextContinuationToken" in s3_res:
+            next_continuation_token = s3_res["NextContinuationToken"]
+    logger.info(f"## Dest key index (for sat data service: '{sat_data_service}', count: {len(dest_key_index)})")
+    return dest_key_index
+
+
+def set_watermarks(ssm, watermarks_new: dict[str, str]) -> None:
+    logger.info(f"## Setting the new watermarks SSM parameter to: '{watermarks_new}'")
+    ssm_res = ssm.put_parameter(
+        Name=os.environ[WATERMARK_PARAMETER],
+        # Description,  # Default to the existing description
+        Value=json.dumps(watermarks_new),
+        Type="String",
+        Overwrite=True,
+        Tier="Standard",
+        DataType="text",
+    )
+    logger.info(f"## SSM Put Parameter response: {ssm_res}")
+
+
+def s3_get_timestamp_index(s3, sat_data_service: str) -> tuple[array, str]:
+    timestamp_index = array(timestamp_index_typecode)
+    try:
+        s3_res = s3.get_object(
+            Bucket=os.environ[BUCKET_NAME_DEST],
+            Key=get_timestamp_index_key(sat_data_service),
+            ExpectedBucketOwner=os.environ[ACCOUNT_OWNER_ID],
+        )
+    except s3.exceptions.NoSuchKey:
+        return timestamp_index, None
+    try:
+        timestamp_index.frombytes(s3_res["Body"].read())
+    except ValueError as ex:
+        logger.error(f"## Ignoring the corrupt timestamp index ({ex}): '{get_timestamp_index_key(sat_data_service)}'")
+    return timestamp_index, s3_res["ETag"]
+
+
+# Merge start times into the timestamp index of a sat data service (or replace the timestamp index), using a
+# conditional put on the ETag of the read timestamp index, so concurrent writers never lose each other's start times.
+def s3_update_timestamp_index(s3, sat_data_service: str, timestamps: set[int], replace: bool = False) -> None:
+    retention_days = int(os.getenv(TIMESTAMP_INDEX_RETENTION_DAYS, str(timestamp_index_retention_days_default)))
+    cut_off = int((datetime.now(timezone.utc) - timedelta(days=retention_days)).strftime("%Y%m%d%H%M"))
+    obj_key = get_timestamp_index_key(sat_data_service)
+    for _ in range(timestamp_index_max_attempts):
+        timestamp_index, etag = s3_get_timestamp_index(s3, sat_data_service)
+        if not replace and timestamps.issubset(timestamp_index):
+            return
+        timestamp_index_new = array(
+            timestamp_index_typecode,
+            sorted(i for i in timestamps.union([] if replace else timestamp_index) if i >= cut_off),
+        )
+        try:
+            s3.put_object(
+                Body=timestamp_index_new.tobytes(),
+                Bucket=os.environ[BUCKET_NAME_DEST],
+                Key=obj_key,
+                ExpectedBucketOwner=os.environ[ACCOUNT_OWNER_ID],
+                **({"IfMatch": etag} if etag else {"IfNoneMatch": "*"}),
+            )
+            logger.info(f"## Updated the timestamp index (count: {len(timestamp_index_new)}): '{obj_key}'")
+            return
+        except ClientError as ex:
+            if ex.response["Error"]["Code"] not in {"PreconditionFailed", "ConditionalRequestConflict"}:
+                raise
+            logger.info(f"## Retrying (The timestamp index was updated concurrently): '{obj_key}'")
+    logger.error(
+        f"## Could NOT update the timestamp index (after {timestamp_index_max_attempts} attempts): '{obj_key}'"
+    )
+
+
+# Record the start times of the copied sat data in the timestamp index of each sat data service.
+def s3_update_timestamp_indexes(s3, copy_results: dict[str, dict]) -> None:
+    sat_data_service_timestamps: dict[str, set[int]] = {}
+    for obj_key_dest, copy_result in copy_results.items():
+        if copy_result[status_str] != failed_str and (timestamp := get_obj_start_timestamp(obj_key_dest)):
+            sat_data_service = obj_key_dest.rsplit(sep="/", maxsplit=2)[-2]
+            sat_data_service_timestamps.setdefault(sat_data_service, set()).add(timestamp)
+    for sat_data_service, timestamps in sat_data_service_timestamps.items():
+        try:
+            s3_update_timestamp_index(s3, sat_data_service, timestamps)
+        except (BotoCoreError, ClientError) as ex:
+            # The timestamp index is an optimisation (rebuilt by the recovery entry point), so a failed update never
+            # fails the copies (or holds back the watermarks) it would have recorded.
+            logger.error(f"## Could NOT update the timestamp index (for sat data service: '{sat_data_service}'): {ex}")
+
+
+def s3_list_objects(
+    s3,
+    bucket_name: str,
+    prefix_path: str,
+    continuation_token: str = None,
+    start_after: str = None,
+    expected_bucket_owner: str = None,
+) -> dict:
+    logger.info(f"## Listing S3 objects in: s3://{bucket_name}/{prefix_path}")
+    list_objects_v2_kwargs = {
+        k: v
+        for k, v in {
+            "Bucket": bucket_name,
+            "MaxKeys": 1000,
+            "Prefix": prefix_path,
+            "ExpectedBucketOwner": expected_bucket_owner,  # ONLY use if we own the S3 bucket.
+            "ContinuationToken": continuation_token if continuation_token else None,
+            "StartAfter": start_after if start_after else None,
+        }.items()
+        if v
+    }
+    s3_res = s3.list_objects_v2(**list_objects_v2_kwargs)
+    logger.debug(f"## S3 List Objects V2 response: {s3_res}")
+    return s3_res
 
 
 def lambda_handler(event, context):
@@ -71,52 +512,191 @@ def lambda_handler(event, context):
         logger.error(f"## One or more of {env_keys} is not set in ENVIRONMENT VARIABLES: {os.environ}")
         sys.exit(1)
 
-    s3 = boto3.resource("s3", region_name=os.environ["AWS_REGION"])
-    logger.info("## Connected to S3 via resource")
+    max_workers = int(os.getenv(MAX_WORKERS, str(max_workers_default)))
+
+    s3 = get_s3_client(max_workers)
 
     logger.info(
         f"## Moving S3 objects: (S3 bucket source) '{os.environ[BUCKET_NAME_SOURCE]}' -> "
         f"(S3 bucket dest) '{os.environ[BUCKET_NAME_DEST]}-%Y'"
     )
 
-    total_moved: int = 0
-    total_skipped: int = 0
-    moved_objs: list[str] = []
-    skipped_objs: list[str] = []
-    for sat_data_service, sat_data_service_meta in dict(json.loads(os.environ[SAT_DATA_SERVICES])).items():
-        for obj_prefix_source in get_obj_prefix_sources(sat_data_service_meta):
-            for obj in s3.Bucket(os.environ[BUCKET_NAME_SOURCE]).objects.filter(Prefix=obj_prefix_source):
-                obj_key = str(obj.key).rsplit(sep="/", maxsplit=1)[-1]
-                if (
-                    sat_data_source_filter in sat_data_service_meta
-                    and sat_data_service_meta[sat_data_source_filter] is not None
-                    and sat_data_service_meta[sat_data_source_filter] not in obj_key
-                ):
+    dest_key_index_cache_enabled: bool = json.loads(os.getenv(DEST_KEY_INDEX_CACHE_ENABLED, "true").lower())
+    if not dest_key_index_cache_enabled:
+        dest_key_index_cache.clear()
+
+    sat_data_services: dict[str, dict] = dict(json.loads(os.environ[SAT_DATA_SERVICES]))
+    timestamp_index_enabled: bool = json.loads(os.getenv(TIMESTAMP_INDEX_ENABLED, "false").lower())
+
+    ssm = None
+    watermarks: dict[str, str] = {}
+    if WATERMARK_PARAMETER in os.environ:
+        ssm = boto3.client("ssm", region_name=os.environ["AWS_REGION"])
+        logger.info("## Connected to SSM via client")
+        watermarks = get_watermarks(ssm)
+
+    sat_data_service_dts: dict[str, list[datetime]] = {
+        sat_data_service: get_obj_prefix_dts(
+            get_obj_prefix_dt(watermarks[sat_data_service]) if sat_data_service in watermarks else None
+        )
+        for sat_data_service in sat_data_services
+    }
+
+    # Catch up on the source prefix folders (oldest first) in batches, while the invocation time budget allows.
+    batch_size = int(get_obj_prefix_window() / get_obj_prefix_interval())
+    num_batches = max(-(-len(obj_prefix_dts) // batch_size) for obj_prefix_dts in sat_data_service_dts.values())
+    time_reserve_millis = int(os.getenv(TIME_RESERVE_MILLIS, str(time_reserve_millis_default)))
+    watermarks_new: dict[str, str] = dict(watermarks)
+    watermarks_blocked: set[str] = set()
+    copy_results: dict[str, dict] = {}
+    batch_millis: int = 0
+    for i in range(num_batches):
+        if (
+            i
+            and hasattr(context, "get_remaining_time_in_millis")
+            and (remaining_millis := context.get_remaining_time_in_millis()) < time_reserve_millis + batch_millis
+        ):
+            logger.info(
+                f"## Stopping catch up (batch: {i}/{num_batches}), not enough invocation time left: {remaining_millis}ms"
+            )
+            break
+        batch_start = time.monotonic()
+        batch_dts = {
+            sat_data_service: batch_obj_prefix_dts
+            for sat_data_service, obj_prefix_dts in sat_data_service_dts.items()
+            if (batch_obj_prefix_dts := obj_prefix_dts[i * batch_size : (i + 1) * batch_size])
+        }
+        sat_data_service_copy_jobs, batch_copy_results = move_sat_data_objs(
+            s3, sat_data_services, batch_dts, max_workers
+        )
+        copy_results.update(batch_copy_results)
+        if timestamp_index_enabled:
+            s3_update_timestamp_indexes(s3, batch_copy_results)
+        for sat_data_service, candidate_jobs in sat_data_service_copy_jobs.items():
+            if sat_data_service in watermarks_blocked:
+                continue
+            watermark_new, is_blocked = get_watermark_new(
+                candidate_jobs, batch_copy_results, watermarks_new.get(sat_data_service)
+            )
+            if watermark_new:
+                watermarks_new[sat_data_service] = watermark_new
+            if is_blocked:
+                watermarks_blocked.add(sat_data_service)
+        batch_millis = int((time.monotonic() - batch_start) * 1000)
+        logger.info(f"## Batch {i + 1}/{num_batches} took: {batch_millis}ms")
+
+    if ssm is not None and watermarks_new != watermarks:
+        set_watermarks(ssm, watermarks_new)
+
+    moved_objs: list[str] = sorted(k for k, v in copy_results.items() if v[status_str] == moved_str)
+    skipped_objs: list[str] = sorted(k for k, v in copy_results.items() if v[status_str] == skipped_str)
+    failed_objs: list[str] = sorted(k for k, v in copy_results.items() if v[status_str] == failed_str)
+    logger.info(f"## Moved S3 objects (count: {len(moved_objs)}): {moved_objs}")
+    logger.info(f"## Skipped S3 objects (count: {len(skipped_objs)}): {skipped_objs}")
+    if failed_objs:
+        logger.error(f"## Failed S3 objects (count: {len(failed_objs)}): {failed_objs}")
+
+    return {status_str: "FAILED" if failed_objs else "SUCCEEDED", responses_str: copy_results}
+
+
+# Event-driven entry point: copies the sat data of the S3 object created notifications (from the source S3 bucket)
+# in an SQS batch (or SNS notification) straight away, returning any messages with failed copies for a retry.
+def notification_handler(event, context):
+    env_keys = {
+        ACCOUNT_OWNER_ID,
+        BUCKET_NAME_SOURCE,
+        BUCKET_NAME_DEST,
+        SAT_DATA_ORG,
+        SOURCE_NAME,
+        SAT_DATA_SERVICES,
+    }
+    if not all(k in os.environ for k in env_keys):
+        logger.error(f"## One or more of {env_keys} is not set in ENVIRONMENT VARIABLES: {os.environ}")
+        sys.exit(1)
+
+    logger.info(f"## EVENT: {event}")
+
+    max_workers = int(os.getenv(MAX_WORKERS, str(max_workers_default)))
+    sat_data_services: dict[str, dict] = dict(json.loads(os.environ[SAT_DATA_SERVICES]))
+
+    copy_jobs: dict[str, tuple[str, int]] = {}
+    copy_job_msg_ids: dict[str, set[str]] = {}
+    failed_msg_ids: list[str] = []
+    for record in event.get("Records", []):
+        msg_id: str = record.get("messageId") or record.get("Sns", {}).get("MessageId")
+        record_copy_jobs: dict[str, tuple[str, int]] = {}
+        try:
+            for s3_record in get_notification_s3_records(record):
+                if not str(s3_record.get("eventName", "")).startswith("ObjectCreated:"):
+                    continue
+                bucket_name_source = s3_record["s3"]["bucket"]["name"]
+                if bucket_name_source != os.environ[BUCKET_NAME_SOURCE]:
+                    logger.info(f"## Skipping (Not the source S3 bucket): '{bucket_name_source}'")
                     continue
-                obj_prefix_dest = f"{os.environ[SAT_DATA_ORG]}/{os.environ[SOURCE_NAME]}/{sat_data_service}/{obj_key}"
-                s3_obj = s3.Object(os.environ[BUCKET_NAME_DEST], obj_prefix_dest)
-                try:
-                    s3_obj.load()
-                    logger.info(f"## Skipping (The S3 object already exists): '{obj_prefix_dest}'")
-                    total_skipped += 1
-                    skipped_objs.append(obj_prefix_dest)
-                except ClientError as ex:
-                    if ex.response["Error"]["Code"] != "404":
-                        # Cannot determine whether the S3 object does not exist.
-                        logger.error(f"## Skipping ({ex}): '{obj_prefix_dest}'")
-                        continue
-                    s3_obj.copy(
-                        CopySource={
-                            "Bucket": obj.bucket_name,
-                            "Key": obj.key,
-                        },
-                        ExtraArgs={
-                            # "ExpectedBucketOwner": os.environ[ACCOUNT_OWNER_ID],  # ONLY use if we own the source S3 bucket.
-                            # "StorageClass": "STANDARD",  # ONLY use if in the destination S3 bucket the new object should have a non-STANDARD storage class
-                        },
-                    )
-                    total_moved += 1
-                    moved_objs.append(obj_prefix_dest)
-
-    logger.info(f"## Moved S3 objects (count: {total_moved}): {moved_objs}")
-    logger.info(f"## Skipped S3 objects (count: {total_skipped}): {skipped_objs}")
+                obj_key_source = urllib.parse.unquote_plus(s3_record["s3"]["object"]["key"])
+                obj_size = int(s3_record["s3"]["object"].get("size", 0))
+                for sat_data_service, sat_data_service_meta in sat_data_services.items():
+                    if obj_prefix_dest := get_obj_prefix_dest(sat_data_service, sat_data_service_meta, obj_key_source):
+                        record_copy_jobs[obj_prefix_dest] = (obj_key_source, obj_size)
+        except (AttributeError, KeyError, TypeError, ValueError) as ex:
+            logger.error(f"## Could NOT read the S3 event notification records ({ex}): '{msg_id}'")
+            failed_msg_ids.append(msg_id)
+            continue
+        # Only the copy jobs of a fully read message are queued, a malformed message is retried as a whole.
+        copy_jobs.update(record_copy_jobs)
+        for obj_prefix_dest in record_copy_jobs:
+            copy_job_msg_ids.setdefault(obj_prefix_dest, set()).add(msg_id)
+
+    s3 = get_s3_client(max_workers)
+    copy_results = s3_copy_objects(s3, copy_jobs, max_workers)
+    if json.loads(os.getenv(TIMESTAMP_INDEX_ENABLED, "false").lower()):
+        s3_update_timestamp_indexes(s3, copy_results)
+
+    moved_objs: list[str] = sorted(k for k, v in copy_results.items() if v[status_str] == moved_str)
+    logger.info(f"## Moved S3 objects (count: {len(moved_objs)}): {moved_objs}")
+    for obj_prefix_dest, copy_result in copy_results.items():
+        if copy_result[status_str] == moved_str:
+            dest_key_index_cache.setdefault(obj_prefix_dest.rsplit(sep="/", maxsplit=2)[-2], set()).add(obj_prefix_dest)
+        else:
+            logger.error(f"## Failed S3 object: '{obj_prefix_dest}'")
+            failed_msg_ids += sorted(copy_job_msg_ids[obj_prefix_dest])
+
+    return {batch_item_failures_str: [{item_identifier_str: i} for i in dict.fromkeys(failed_msg_ids)]}
+
+
+# Recovery entry point: rebuilds the timestamp index of each sat data service (or of the 'sat_data_services' in the
+# event) from a full listing of the dest prefix of the sat data service.
+def rebuild_timestamp_index_handler(event, context):
+    env_keys = {ACCOUNT_OWNER_ID, BUCKET_NAME_DEST, SAT_DATA_ORG, SOURCE_NAME, SAT_DATA_SERVICES}
+    if not all(k in os.environ for k in env_keys):
+        logger.error(f"## One or more of {env_keys} is not set in ENVIRONMENT VARIABLES: {os.environ}")
+        sys.exit(1)
+
+    logger.info(f"## EVENT: {event}")
+
+    s3 = get_s3_client(1)
+
+    responses: dict[str, int] = {}
+    for sat_data_service in event.get("sat_data_services") or dict(json.loads(os.environ[SAT_DATA_SERVICES])):
+        prefix_path = f"{os.environ[SAT_DATA_ORG]}/{os.environ[SOURCE_NAME]}/{sat_data_service}/"
+        timestamps: set[int] = set()
+        is_truncated = True
+        next_continuation_token = None
+        while is_truncated:
+            s3_res = s3_list_objects(
+                s3,
+                os.environ[BUCKET_NAME_DEST],
+                prefix_path,
+                continuation_token=next_continuation_token,
+                expected_bucket_owner=os.environ[ACCOUNT_OWNER_ID],
+            )
+            is_truncated = s3_res["IsTruncated"]
+            timestamps.update(
+                timestamp for i in s3_res.get("Contents", []) if (timestamp := get_obj_start_timestamp(i["Key"]))
+            )
+            if is_truncated and "NextContinuationToken" in s3_res:
+                next_continuation_token = s3_res["NextContinuationToken"]
+        s3_update_timestamp_index(s3, sat_data_service, timestamps, replace=True)
+        responses[sat_data_service] = len(timestamps)
+
+    return {status_str: "SUCCEEDED", responses_str: responses}
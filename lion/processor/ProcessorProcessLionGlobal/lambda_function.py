@@ -1,13 +1,21 @@
 import base64
+import hashlib
 import json
 import logging
+import multiprocessing
 import os
 import shutil
 import sys
 import tempfile
+import threading
+import time
 import traceback
+import urllib.parse
 import warnings
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import date as datetime_date, timedelta
+from functools import partial
 from pathlib import Path
 
 if "LAMBDA_TASK_ROOT" in os.environ:
@@ -15,6 +23,10 @@ if "LAMBDA_TASK_ROOT" in os.environ:
 
 # pylint: disable=wrong-import-position
 import boto3
+import numpy as np
+import xarray as xr
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
 from sih_lion import __version__ as sih_lion_version
 from sih_lion.processors.base import Processor
@@ -47,41 +59,526 @@ SOURCE_MODULE_NAME = "SOURCE_MODULE_NAME"
 SOURCE_CLASS_NAME = "SOURCE_CLASS_NAME"
 SOURCE_SYSTEM_OBJS = "SOURCE_SYSTEM_OBJS"
 FILENAMES_INFO = "FILENAMES_INFO"
+MAX_WORKERS = "MAX_WORKERS"
+TRANSFER_MAX_CONCURRENCY = "TRANSFER_MAX_CONCURRENCY"
+TRANSFER_MULTIPART_CHUNKSIZE = "TRANSFER_MULTIPART_CHUNKSIZE"
+STATIC_GRID_CACHE_ENABLED = "STATIC_GRID_CACHE_ENABLED"
+STATIC_GRID_CACHE_MAX_BYTES = "STATIC_GRID_CACHE_MAX_BYTES"
+STATIC_GRID_INPUT_MODE = "STATIC_GRID_INPUT_MODE"
+IDEMPOTENCY_ENABLED = "IDEMPOTENCY_ENABLED"
+TIME_RESERVE_MILLIS = "TIME_RESERVE_MILLIS"
+TILE_BANDS = "TILE_BANDS"
+TILE_ROW_DIM = "TILE_ROW_DIM"
 
 TMP_FOP = "TMP_FOP"
 
 status_str = "status"
 responses_str = "responses"
 
+max_workers_default: int = 16  # Inputs staged concurrently.
+transfer_max_concurrency_default: int = 8  # Ranged GETs per (multipart) download of an input.
+transfer_multipart_chunksize_default: int = 16 * 1024 * 1024  # 16 MiB, per ranged GET.
+static_grid_cache_max_bytes_default: int = 1024 * 1024 * 1024  # 1 GiB, keep well below the Lambda ephemeral storage.
+static_grid_input_mode_default: str = "path"  # Or "array", for a sih-lion processor accepting static grid arrays.
+tile_bands_default: int = 1  # Row bands processed in parallel, 1 is the single process path.
+tile_row_dim_default: str = "y"  # The row dimension of the param data files, to stitch the row bands along.
+time_reserve_millis_default: int = 60000  # The invocation time to keep in reserve, when catching up on CSA timestamps.
+
+sat_data_str = "sat_data"
 static_grids_str = "static_grids"
+static_grid_names = ["geolocation", "scan_time_offset", "vaa", "vza"]
+static_grid_cache_dir_name = "static_grid_cache"
+static_grid_input_modes = {"array", "path"}
 csa_str = "csa"
 csa_filename_ext = "npy"
+csa_pointer_dir_name = "latest"
+csa_pointer_key_str = "key"
+csa_pointer_str = "put_csa_pointer"
+csa_pointer_max_attempts: int = 5  # The max number of attempts to update the latest CSA pointer (if written to).
+csa_timestamp_str = "csa_timestamp"
+completion_marker_dir_name = "completed"
+row_band_str = "row_band"
+tile_band_dir_prefix = "tile_band_"
+catch_up_str = "catch_up"
+chained_csa_dir_name = "chained_csa"
 param_data_str = "param_data"
 param_filename_ext = "nc"
 yesterday_str = "yesterday"
 today_str = "today"
 
+# Static grid cache (kept between warm invocations), of the local file paths (in least recently used order) to the
+# file sizes of the static grid files, content-addressed by S3 object key + ETag.
+static_grid_cache: OrderedDict[str, int] = OrderedDict()
+static_grid_cache_lock = threading.Lock()
+# Memory-mapped static grid arrays (kept between warm invocations), of the local file paths of the static grid files.
+static_grid_arrays: dict[str, np.ndarray] = {}
+
+
+# Chain the new CSA file (of a CSA timestamp) locally, as the (today) CSA file input of the next CSA timestamp (rather
+# than downloading it again), and remove the other files of the CSA timestamp (the sat data files, the published param
+# data files, and any row band folders), so a catch up never fills up the temporary folder path.
+def chain_csa(staged_inputs: dict[tuple[str, ...], str], csa_filename: str, atmos_param_filenames: list[str]) -> None:
+    chained_csa_dir = os.path.join(os.environ[TMP_FOP], chained_csa_dir_name)
+    os.makedirs(chained_csa_dir, exist_ok=True)
+    drop_csa_inputs(staged_inputs, [today_str])
+    staged_inputs[(csa_str, today_str)] = os.path.join(chained_csa_dir, csa_filename)
+    os.replace(os.path.join(os.environ[TMP_FOP], csa_filename), staged_inputs[(csa_str, today_str)])
+    logger.info(f"## Chained CSA file: {staged_inputs[(csa_str, today_str)]}")
+    for k in [k for k in staged_inputs if k[0] == sat_data_str]:
+        Path(staged_inputs.pop(k)).unlink(missing_ok=True)
+    for atmos_param_filename in atmos_param_filenames:
+        Path(os.path.join(os.environ[TMP_FOP], atmos_param_filename)).unlink(missing_ok=True)
+    for dp in Path(os.environ[TMP_FOP]).glob(f"{tile_band_dir_prefix}*"):
+        shutil.rmtree(dp)
+
+
+def clear_run(static_grid_cache_enabled: bool) -> None:
+    release_static_grid_arrays()
+    logger.info(f"## Clear the temporary folder path: {os.environ[TMP_FOP]}")
+    # Only remove the per-run scratch files, keeping the static grid cache for warm invocations.
+    clear_tmp_directory(os.environ[TMP_FOP], keep={get_static_grid_cache_dir()} if static_grid_cache_enabled else None)
+    logger.info("## Temporary folder path cleared")
+
+
+# Drop the CSA file inputs (of the date meta keys, e.g. 'today') from the staged inputs, removing their (downloaded, or
+# chained) local files, so they are staged again, and never left behind unreferenced.
+def drop_csa_inputs(staged_inputs: dict[tuple[str, ...], str], keys: list[str]) -> None:
+    for key in keys:
+        if csa_fip := staged_inputs.pop((csa_str, key), None):
+            Path(csa_fip).unlink(missing_ok=True)
+
+
+# Get the recorded outputs of the completed run (of the source, CSA timestamp and sih-lion version) from its completion
+# marker object, or None if there is no completion marker object (i.e. the run is not completed).
+def get_completion_marker(s3, csa_timestamp: str) -> dict:
+    bucket_name = os.environ[S3_SAT_DATA_BUCKET_NAME]
+    marker_key = get_completion_marker_key(csa_timestamp)
+    try:
+        s3_res = s3.get_object(Bucket=bucket_name, Key=marker_key, ExpectedBucketOwner=os.environ[ACCOUNT_OWNER_ID])
+    except ClientError as ex:
+        if ex.response["Error"]["Code"] not in {"NoSuchKey", "404"}:
+            logger.error(f"## ERROR: {ex}")
+        logger.info(f"## No completion marker: s3://{bucket_name}/{marker_key}")
+        return None
+    logger.info(f"## Found completion marker: s3://{bucket_name}/{marker_key}")
+    return json.loads(s3_res["Body"].read())
+
+
+# The completion marker objects are kept outside the CSA files prefix paths (of each date), so they are never listed as
+# CSA files, and are keyed on the sih-lion version, so a new sih-lion version processes a CSA timestamp again.
+def get_completion_marker_key(csa_timestamp: str) -> str:
+    return (
+        f"{csa_str}/{os.environ[DEPLOY_ENV]}/{os.environ[SOURCE_NAME]}/{completion_marker_dir_name}/"
+        f"{sih_lion_version}/{csa_timestamp}.json"
+    )
+
+
+# Get the latest CSA file (of a date), or None if there are no CSA files (of the date).
+def get_csa(s3, date: str, transfer_config: TransferConfig) -> str:
+    bucket_name = os.environ[S3_SAT_DATA_BUCKET_NAME]
+    if (obj_key := get_csa_pointer(s3, bucket_name, os.environ[SOURCE_NAME], date)[0]) is None:
+        # Fallback, for a date written before the latest CSA pointer objects existed.
+        obj_key = get_csa_listed(
+            s3, bucket_name, f"{csa_str}/{os.environ[DEPLOY_ENV]}/{os.environ[SOURCE_NAME]}/{date}"
+        )
+    return (
+        s3_download_fileobj(s3, bucket_name=bucket_name, obj_key=obj_key, transfer_config=transfer_config)
+        if obj_key
+        else None
+    )
+
+
+# Get the S3 object key of the latest CSA file (of a date prefix path), by listing all the CSA files (of the date).
+def get_csa_listed(s3, bucket_name: str, prefix_path: str) -> str:
+    csa_files = set()
+    is_truncated = True
+    next_continuation_token = None
+    while is_truncated:
+        s3_res = s3_list_objects(s3, bucket_name, prefix_path, continuation_token=next_continuation_token)
+        is_truncated = s3_res["IsTruncated"]
+        if "Contents" in s3_res:
+            csa_files = csa_files.union({i["Key"].rsplit(sep="/", maxsplit=1)[-1] for i in s3_res["Contents"]})
+        if is_truncated and "NextContinuationToken" in s3_res:
+            next_continuation_token = s3_res["NextContinuationToken"]
+    return f"{prefix_path}/{csa_files_list[0]}" if (csa_files_list := sorted(list(csa_files), reverse=True)) else None
+
+
+# Get the S3 object key of the latest CSA file (of a date) from the latest CSA pointer object (of the date), with a
+# single GET, and the ETag of the latest CSA pointer object, or None (for both) if there is no latest CSA pointer object.
+def get_csa_pointer(s3, bucket_name: str, source_name: str, date: str) -> tuple[str, str]:
+    pointer_key = get_csa_pointer_key(source_name, date)
+    try:
+        s3_res = s3.get_object(Bucket=bucket_name, Key=pointer_key, ExpectedBucketOwner=os.environ[ACCOUNT_OWNER_ID])
+    except ClientError as ex:
+        if ex.response["Error"]["Code"] not in {"NoSuchKey", "404"}:
+            logger.error(f"## ERROR: {ex}")
+        logger.info(f"## No latest CSA pointer: s3://{bucket_name}/{pointer_key}")
+        return None, None
+    obj_key = json.loads(s3_res["Body"].read())[csa_pointer_key_str]
+    logger.info(f"## Latest CSA pointer (s3://{bucket_name}/{pointer_key}): {obj_key}")
+    return obj_key, s3_res["ETag"]
+
+
+# The latest CSA pointer object (of a date) is kept outside the CSA files prefix path (of the date), so it is never
+# listed as a CSA file.
+def get_csa_pointer_key(source_name: str, date: str) -> str:
+    return f"{csa_str}/{os.environ[DEPLOY_ENV]}/{source_name}/{csa_pointer_dir_name}/{date}.json"
+
+
+# Evict the least recently used static grid files, until the static grid cache fits its max size, without evicting the
+# pinned static grid files (in use by the current run). Files in the cache directory that are not in the static grid
+# cache (e.g. partial downloads) are removed.
+def evict_static_grid_cache(pinned: set[str]) -> None:
+    cache_dir = get_static_grid_cache_dir()
+    for f in os.listdir(cache_dir):
+        if (filename := os.path.join(cache_dir, f)) not in static_grid_cache:
+            logger.info(f"## Removing file not in the static grid cache: {filename}")
+            os.remove(filename)
+    max_bytes = int(os.getenv(STATIC_GRID_CACHE_MAX_BYTES, str(static_grid_cache_max_bytes_default)))
+    cache_bytes = sum(static_grid_cache.values())
+    for filename in list(static_grid_cache):
+        if cache_bytes <= max_bytes:
+            break
+        if filename in pinned:
+            continue
+        cache_bytes -= static_grid_cache.pop(filename)
+        static_grid_arrays.pop(filename, None)
+        Path(filename).unlink(missing_ok=True)
+        logger.info(f"## Evicted from the static grid cache: {filename}")
+    logger.info(f"## Static grid cache size: {cache_bytes} bytes (count: {len(static_grid_cache)})")
+
+
+def get_process_input(
+    data_service_files: dict[str, list[str]], dt_meta: dict[str, str], staged_inputs: dict[tuple[str, ...], str]
+) -> dict:
+    return {
+        **{
+            data_service: [staged_inputs[(sat_data_str, data_service, f)] for f in files]
+            for data_service, files in data_service_files.items()
+        },
+        static_grids_str: {i: staged_inputs[(static_grids_str, i)] for i in static_grid_names},
+        csa_str: {key: staged_inputs[(csa_str, key)] for key in dt_meta},
+    }
+
+
+def get_publishing_jobs(
+    s3, processor_name: str, source_data: dict, dt_today: str, transfer_config: TransferConfig
+) -> dict[tuple[str, ...], partial]:
+    publishing_jobs = {
+        (csa_str,): partial(publish_csa, s3, processor_name, dt_today, source_data["csa"], transfer_config)
+    }
+    for atmos_param_filename in source_data.get("params") or []:
+        publishing_jobs[(param_data_str, atmos_param_filename)] = partial(
+            s3_put_object,
+            s3,
+            os.environ[S3_PARAM_DATA_BUCKET_NAME],
+            f"{os.environ[S3_PARAM_DATA_BUCKET_OBJ_PREFIX]}/{atmos_param_filename}",
+            os.path.join(os.environ[TMP_FOP], atmos_param_filename),
+            transfer_config,
+        )
+    return publishing_jobs
+
+
+def get_put_object_args(bucket_name: str, prefix_path: str) -> dict:
+    return {
+        "ACL": "bucket-owner-full-control",
+        "Bucket": bucket_name,
+        "ChecksumAlgorithm": os.environ[CHECKSUM_ALGORITHM],
+        "Key": prefix_path,
+        # TODO: (OPTIONAL) Add key-value pairs metadata for S3 object
+        # "Metadata": {
+        #     'string': 'string'
+        # },
+        "ServerSideEncryption": "aws:kms",
+        "StorageClass": "STANDARD",
+        "SSEKMSKeyId": os.environ[KMS_MASTER_KEY_ID],
+        "SSEKMSEncryptionContext": base64.b64encode(
+            json.dumps({os.environ[ENCRYPTION_CONTEXT_KEY]: os.environ[CDK_STACK_NAME]}).encode("ascii")
+        ).decode("ascii"),
+        "BucketKeyEnabled": True,
+        # Tags are applied inline (rather than by a separate put_object_tagging request).
+        "Tagging": urllib.parse.urlencode({i["Key"]: i["Value"] for i in json.loads(os.environ[TAGS])}),
+        # "ObjectLockMode": 'GOVERNANCE' | 'COMPLIANCE',
+        # "ObjectLockRetainUntilDate": datetime(2015, 1, 1),
+        # "ObjectLockLegalHoldStatus": 'ON' | 'OFF',
+        "ExpectedBucketOwner": os.environ[ACCOUNT_OWNER_ID],
+    }
+
+
+def get_row_bands(num_rows: int, tile_bands: int) -> list[tuple[int, int]]:
+    return [(i * num_rows // tile_bands, (i + 1) * num_rows // tile_bands) for i in range(tile_bands)]
+
+
+# Get the row count of the full-disk grid, from a per-pixel static grid (a local file path, or an array).
+def get_num_rows(process_input: dict) -> int:
+    vza = process_input[static_grids_str]["vza"]
+    return (np.load(vza, mmap_mode="r") if isinstance(vza, str) else vza).shape[0]
+
+
+def get_s3_client(max_workers: int, transfer_max_concurrency: int):
+    # One client shared by all staging workers, with a connection pool large enough for every ranged GET of every worker.
+    s3 = boto3.client(
+        "s3",
+        region_name=os.environ["AWS_REGION"],
+        config=Config(max_pool_connections=max(max_workers * transfer_max_concurrency, 10)),
+    )
+    logger.info("## Connected to S3 via client")
+    return s3
 
-def get_sat_data(s3, data_service_files: dict[str, list[str]]) -> dict:
-    logger.info("## Getting sat data")
-    for data_service, files in dict(data_service_files).items():
-        local_file_paths = []
+
+def get_staging_jobs(
+    s3, data_service_files: dict[str, list[str]], dt_meta: dict[str, str], transfer_config: TransferConfig
+) -> dict[tuple[str, ...], partial]:
+    staging_jobs = {}
+    for data_service, files in data_service_files.items():
         for f in files:
             obj_props = f.split(sep="/", maxsplit=1)  # Gets: [bucket_name, obj_name]
-            local_file_path = os.path.join(os.environ[TMP_FOP], f)
-            s3_download_fileobj(s3, bucket_name=obj_props[0], obj_key=obj_props[1], filename=local_file_path)
-            local_file_paths.append(local_file_path)
-        data_service_files[data_service] = local_file_paths
-    logger.info(f"## Sat data: {data_service_files}")
-    return data_service_files
+            staging_jobs[(sat_data_str, data_service, f)] = partial(
+                s3_download_fileobj,
+                s3,
+                bucket_name=obj_props[0],
+                obj_key=obj_props[1],
+                filename=os.path.join(os.environ[TMP_FOP], f),
+                transfer_config=transfer_config,
+            )
+    for i in static_grid_names:
+        staging_jobs[(static_grids_str, i)] = partial(get_static_grid, s3, i, transfer_config)
+    for key, date in dt_meta.items():
+        staging_jobs[(csa_str, key)] = partial(get_csa, s3, date, transfer_config)
+    return staging_jobs
+
+
+def get_source_data(processor: Processor, process_input: dict, tile_bands: int) -> dict:
+    if tile_bands == 1:
+        return processor.get_data(**process_input)
+    return get_source_data_tiled(processor, process_input, tile_bands)
+
+
+# Run the processor on each row band of the full-disk grid in parallel, each in a forked worker process (sharing the
+# memory-mapped inputs of the parent process), then stitch the outputs of the row bands back together. Worker processes
+# are connected by pipes, as the Lambda execution environment has no /dev/shm for a ProcessPoolExecutor (or a Pool).
+def get_source_data_tiled(processor: Processor, process_input: dict, tile_bands: int) -> dict:
+    row_bands = get_row_bands(get_num_rows(process_input), tile_bands)
+    logger.info(f"## Processing row bands (count: {tile_bands}): {row_bands}")
+    start = time.perf_counter()
+    ctx = multiprocessing.get_context("fork")
+    workers = []
+    for i, row_band in enumerate(row_bands):
+        band_tmp_fop = os.path.join(os.environ[TMP_FOP], f"{tile_band_dir_prefix}{i}")
+        os.makedirs(band_tmp_fop, exist_ok=True)
+        parent_conn, child_conn = ctx.Pipe(duplex=False)
+        worker = ctx.Process(
+            target=process_row_band, args=(child_conn, processor, process_input, row_band, band_tmp_fop)
+        )
+        worker.start()
+        child_conn.close()
+        workers.append((worker, parent_conn, band_tmp_fop))
+    band_source_data = []
+    for worker, parent_conn, band_tmp_fop in workers:
+        try:
+            res = parent_conn.recv()
+        except EOFError:
+            res = RuntimeError(f"## Row band worker process exited without a result (in: {band_tmp_fop})")
+        worker.join()
+        band_source_data.append((band_tmp_fop, res))
+    for _, res in band_source_data:
+        if isinstance(res, Exception):
+            raise res
+    logger.info(f"## Processed row bands (count: {tile_bands}) in {time.perf_counter() - start:.3f}s")
+    return stitch_row_bands(band_source_data)
+
+
+def get_static_grid(s3, static_grid_name: str, transfer_config: TransferConfig) -> str:
+    bucket_name = os.environ[PYPI_PACKAGE_S3_BUCKET_NAME]
+    obj = [
+        obj
+        for obj in s3_list_objects(
+            s3,
+            bucket_name,
+            f"{os.environ[PYPI_PACKAGE_S3_BUCKET_BRANCH]}/sih_lion/"
+            f"{static_grids_str}/satellite/{os.environ[SOURCE_NAME]}/{static_grid_name}",
+        )["Contents"]
+        if str(obj["Key"]).endswith(".npy")
+    ][0]
+    if json.loads(os.getenv(STATIC_GRID_CACHE_ENABLED, "true").lower()):
+        return get_static_grid_cached(s3, bucket_name, obj["Key"], obj["ETag"], transfer_config)
+    return s3_download_fileobj(s3, bucket_name=bucket_name, obj_key=obj["Key"], transfer_config=transfer_config)
+
+
+# Get a static grid file from the static grid cache, downloading it (to the cache) if the S3 object key + ETag is not
+# cached, so a changed static grid is always downloaded again.
+def get_static_grid_cached(s3, bucket_name: str, obj_key: str, etag: str, transfer_config: TransferConfig) -> str:
+    filename = os.path.join(
+        get_static_grid_cache_dir(),
+        f"{hashlib.sha256(f'{bucket_name}/{obj_key}:{etag}'.encode()).hexdigest()}.{Path(obj_key).suffix[1:]}",
+    )
+    with static_grid_cache_lock:
+        if filename in static_grid_cache and os.path.isfile(filename):
+            static_grid_cache.move_to_end(filename)
+            logger.info(f"## Static grid cache hit: s3://{bucket_name}/{obj_key} (ETag: {etag})")
+            return filename
+    logger.info(f"## Static grid cache miss: s3://{bucket_name}/{obj_key} (ETag: {etag})")
+    # Download to a partial file first, so an interrupted download is never mistaken for a cached static grid file.
+    os.replace(
+        s3_download_fileobj(
+            s3, bucket_name=bucket_name, obj_key=obj_key, filename=f"{filename}.part", transfer_config=transfer_config
+        ),
+        filename,
+    )
+    with static_grid_cache_lock:
+        static_grid_cache[filename] = os.path.getsize(filename)
+    return filename
 
 
-def s3_download_fileobj(s3, bucket_name: str, obj_key: str, filename: str = None) -> str:
+def get_static_grid_array(filename: str) -> np.ndarray:
+    # Only a static grid file in the static grid cache (content-addressed) is unchanged since it was memory-mapped.
+    if (array := static_grid_arrays.get(filename)) is None or filename not in static_grid_cache:
+        # A read-only mapping, so the static grid is paged in from the local file on demand (and the pages are shared
+        # between warm invocations), rather than read and copied into memory in full on every invocation.
+        array = static_grid_arrays[filename] = np.load(filename, mmap_mode="r")
+        logger.info(f"## Memory-mapped static grid: {filename} (shape: {array.shape}, dtype: {array.dtype})")
+    return array
+
+
+def get_static_grid_cache_dir() -> str:
+    cache_dir = os.path.join(os.environ[TMP_FOP], static_grid_cache_dir_name)
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def get_transfer_config() -> TransferConfig:
+    multipart_chunksize = int(os.getenv(TRANSFER_MULTIPART_CHUNKSIZE, str(transfer_multipart_chunksize_default)))
+    return TransferConfig(
+        multipart_threshold=multipart_chunksize,
+        multipart_chunksize=multipart_chunksize,
+        max_concurrency=int(os.getenv(TRANSFER_MAX_CONCURRENCY, str(transfer_max_concurrency_default))),
+        use_threads=True,
+    )
+
+
+# Process a CSA timestamp: stage its inputs (other than the inputs already staged), run the processor and publish its
+# outputs. Returns the S3 responses of the outputs, whether publishing any output failed, and the new CSA file (or None,
+# if no CSA file was created).
+# pylint: disable-next=too-many-arguments
+def process_timestamp(
+    s3,
+    processor: Processor,
+    dt_meta: dict[str, str],
+    data_service_files: dict[str, list[str]],
+    staged_inputs: dict[tuple[str, ...], str],
+    transfer_config: TransferConfig,
+    max_workers: int,
+    tile_bands: int,
+    static_grid_input_mode: str,
+    static_grid_cache_enabled: bool,
+) -> tuple[dict, bool, str]:
+    # Stage the sat data files, static grids and CSA files, as one concurrent download plan.
+    staging_jobs = get_staging_jobs(s3, data_service_files, dt_meta, transfer_config)
+    staged_inputs.update(stage_inputs({k: v for k, v in staging_jobs.items() if k not in staged_inputs}, max_workers))
+    process_input = get_process_input(data_service_files, dt_meta, staged_inputs)
+    for key in dt_meta:
+        logger.info(f"## Found CSA file (for {key}): {process_input[csa_str][key]}")
+    if static_grid_cache_enabled:
+        evict_static_grid_cache(set(process_input[static_grids_str].values()))
+
+    logger.info(f"## Process Input: '{process_input}'")
+
+    if static_grid_input_mode == "array":
+        logger.info("## Passing the static grids as memory-mapped arrays")
+        process_input[static_grids_str] = {
+            k: get_static_grid_array(v) for k, v in process_input[static_grids_str].items()
+        }
+
+    source_data = None
+    try:
+        source_data = get_source_data(processor, process_input, tile_bands)
+    except OSError as ex:
+        logger.info(f"## Could not get processor source data: {ex}")
+        traceback.print_exc()  # Prints the traceback for debugging
+
+    if (csa_filename := source_data.get("csa")) is None:
+        logger.error("## No CSA file found.")
+        return {}, True, None
+
+    logger.info(f"## New CSA file: {csa_filename}")
+    if source_data.get("params") is None:
+        logger.info("## No param data files found.")
+
+    # Write new CSA file, and new param data file(s), to S3
+    published_outputs = publish_outputs(
+        get_publishing_jobs(s3, processor.name, source_data, dt_meta[today_str], transfer_config), max_workers
+    )
+    s3_res = {
+        csa_str: published_outputs[(csa_str,)],
+        param_data_str: {k[1]: v for k, v in published_outputs.items() if k[0] == param_data_str},
+    }
+    return s3_res, any(status_str in v for v in published_outputs.values()), csa_filename
+
+
+# Run the processor on a row band of the full-disk grid (in a forked worker process), writing its outputs to its own
+# temporary folder path, and send the processor source data (or the exception raised) to the parent process.
+def process_row_band(conn, processor: Processor, process_input: dict, row_band: tuple[int, int], band_tmp_fop: str):
+    try:
+        os.environ[TMP_FOP] = band_tmp_fop
+        tempfile.tempdir = band_tmp_fop
+        res = processor.get_data(**process_input, **{row_band_str: row_band})
+    except Exception as ex:  # pylint: disable=broad-exception-caught
+        res = ex
+    try:
+        conn.send(res)
+    except Exception as ex:  # pylint: disable=broad-exception-caught
+        conn.send(RuntimeError(f"## Could not send the row band {row_band} result: {ex}"))
+    finally:
+        conn.close()
+
+
+# Write the new CSA file to S3, then point the latest CSA pointer object (of the date) at it.
+def publish_csa(s3, processor_name: str, date: str, csa_filename: str, transfer_config: TransferConfig) -> dict:
+    bucket_name = os.environ[S3_SAT_DATA_BUCKET_NAME]
+    obj_key = f"{csa_str}/{os.environ[DEPLOY_ENV]}/{processor_name}/{date}/{csa_filename}"
+    s3_res = s3_put_object(s3, bucket_name, obj_key, os.path.join(os.environ[TMP_FOP], csa_filename), transfer_config)
+    if status_str not in s3_res:
+        s3_res.update(set_csa_pointer(s3, bucket_name, processor_name, date, obj_key))
+    return s3_res
+
+
+# Publish all the outputs concurrently, each by a publishing job (which returns the S3 responses of the output), and
+# report the publishing time of each output.
+def publish_outputs(publishing_jobs: dict[tuple[str, ...], partial], max_workers: int) -> dict[tuple[str, ...], dict]:
+    logger.info(f"## Publishing outputs (count: {len(publishing_jobs)}, max workers: {max_workers})")
+    start = time.perf_counter()
+    published_outputs: dict[tuple[str, ...], dict] = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(run_timed, publishing_job): k for k, publishing_job in publishing_jobs.items()}
+        for future in as_completed(futures):
+            published_outputs[futures[future]], publishing_time = future.result()
+            logger.info(f"## Published output '{'/'.join(futures[future])}' in {publishing_time:.3f}s")
+    logger.info(f"## Published outputs (count: {len(publishing_jobs)}) in {time.perf_counter() - start:.3f}s")
+    return published_outputs
+
+
+# Release the memory-mapped static grid arrays of static grid files not in the static grid cache, as those files are
+# removed with the per-run scratch files.
+def release_static_grid_arrays() -> None:
+    for filename in [i for i in static_grid_arrays if i not in static_grid_cache]:
+        del static_grid_arrays[filename]
+
+
+# Run a (staging or publishing) job, returning its result and its run time (in seconds).
+def run_timed(job: partial) -> tuple:
+    start = time.perf_counter()
+    res = job()
+    return res, time.perf_counter() - start
+
+
+def s3_download_fileobj(
+    s3, bucket_name: str, obj_key: str, filename: str = None, transfer_config: TransferConfig = None
+) -> str:
     if filename is None:
         filename = os.path.join(os.environ[TMP_FOP], bucket_name, obj_key)
     os.makedirs(os.path.dirname(filename), exist_ok=True)
     with open(filename, "wb") as f:
-        s3.download_fileobj(bucket_name, obj_key, f)
+        s3.download_fileobj(bucket_name, obj_key, f, Config=transfer_config)
     return filename
 
 
@@ -103,59 +600,161 @@ def s3_list_objects(s3, bucket_name: str, prefix_path: str, continuation_token:
     return s3_res
 
 
-def s3_put_object(s3, bucket_name: str, prefix_path: str, fip: str) -> dict:
+# Upload a large file as a multipart upload, with the parts uploaded concurrently (and each part checksummed). Managed
+# transfers (e.g. upload_file) can't set BucketKeyEnabled, so the multipart upload is driven by the S3 client here.
+def s3_multipart_upload(s3, fip: str, put_object_args: dict, transfer_config: TransferConfig) -> dict:
+    mpu_props = {
+        "Bucket": put_object_args["Bucket"],
+        "Key": put_object_args["Key"],
+        "ExpectedBucketOwner": put_object_args["ExpectedBucketOwner"],
+    }
+    mpu_props["UploadId"] = s3.create_multipart_upload(**put_object_args)["UploadId"]
+    part_size = transfer_config.multipart_chunksize
+    checksum_key = f"Checksum{put_object_args['ChecksumAlgorithm']}"  # E.g. ChecksumSHA256
+
+    def upload_part(part_number: int) -> dict:
+        with open(fip, "rb") as f:
+            f.seek((part_number - 1) * part_size)
+            body = f.read(part_size)
+        res = s3.upload_part(
+            Body=body,
+            ChecksumAlgorithm=put_object_args["ChecksumAlgorithm"],
+            PartNumber=part_number,
+            **mpu_props,
+        )
+        return {"ETag": res["ETag"], "PartNumber": part_number, checksum_key: res[checksum_key]}
+
+    try:
+        with ThreadPoolExecutor(max_workers=transfer_config.max_concurrency) as executor:
+            parts = list(executor.map(upload_part, range(1, -(-os.path.getsize(fip) // part_size) + 1)))
+        return s3.complete_multipart_upload(MultipartUpload={"Parts": parts}, **mpu_props)
+    except Exception:
+        # Abort, so the uploaded parts are not left (and billed) in the bucket.
+        s3.abort_multipart_upload(**mpu_props)
+        raise
+
+
+def s3_put_object(s3, bucket_name: str, prefix_path: str, fip: str, transfer_config: TransferConfig) -> dict:
     s3_res = {}
+    put_object_args = get_put_object_args(bucket_name, prefix_path)
 
-    with open(fip, "rb") as f:
-        logger.info(f"## Creating a new S3 object: s3://{bucket_name}/{prefix_path}")
+    logger.info(f"## Creating a new S3 object: s3://{bucket_name}/{prefix_path}")
+    try:
+        if os.path.getsize(fip) < transfer_config.multipart_threshold:
+            with open(fip, "rb") as f:
+                s3_res["put_object"] = s3.put_object(Body=f, **put_object_args)
+            logger.info(f"## S3 Put Object response: {s3_res['put_object']}")
+        else:
+            s3_res["multipart_upload"] = s3_multipart_upload(s3, fip, put_object_args, transfer_config)
+            logger.info(f"## S3 Multipart Upload response: {s3_res['multipart_upload']}")
+    except ClientError as ex:
+        logger.error(f"## ERROR: {ex}")
+        return status_failed(s3_res)
+
+    return s3_res
+
+
+# Point the latest CSA pointer object (of a date) at a CSA file, using a conditional put on the ETag of the read latest
+# CSA pointer object, so a concurrent write of a newer CSA file is never overwritten by an older one.
+def set_csa_pointer(s3, bucket_name: str, source_name: str, date: str, obj_key: str) -> dict:
+    pointer_key = get_csa_pointer_key(source_name, date)
+    for _ in range(csa_pointer_max_attempts):
+        # Only ever move the latest CSA pointer object forward (the latest CSA file sorts last), so an out-of-order
+        # write never points it back at an older CSA file.
+        obj_key_old, etag = get_csa_pointer(s3, bucket_name, source_name, date)
+        if obj_key_old is not None and obj_key_old >= obj_key:
+            logger.info(f"## Skipping (The latest CSA pointer is not older): '{obj_key_old}'")
+            return {}
+        logger.info(f"## Pointing the latest CSA pointer (s3://{bucket_name}/{pointer_key}) at: {obj_key}")
         try:
-            s3_res["put_object"] = s3.put_object(
-                ACL="bucket-owner-full-control",
-                Body=f,
-                Bucket=bucket_name,
-                ChecksumAlgorithm=os.environ[CHECKSUM_ALGORITHM],
-                Key=prefix_path,
-                # TODO: (OPTIONAL) Add key-value pairs metadata for S3 object
-                # Metadata={
-                #     'string': 'string'
-                # },
-                ServerSideEncryption="aws:kms",
-                StorageClass="STANDARD",
-                SSEKMSKeyId=os.environ[KMS_MASTER_KEY_ID],
-                SSEKMSEncryptionContext=base64.b64encode(
-                    json.dumps({os.environ[ENCRYPTION_CONTEXT_KEY]: os.environ[CDK_STACK_NAME]}).encode("ascii")
-                ).decode("ascii"),
-                BucketKeyEnabled=True,
-                # ObjectLockMode='GOVERNANCE' | 'COMPLIANCE',
-                # ObjectLockRetainUntilDate=datetime(2015, 1, 1),
-                # ObjectLockLegalHoldStatus='ON' | 'OFF',
-                ExpectedBucketOwner=os.environ[ACCOUNT_OWNER_ID],
+            s3_res = s3.put_object(
+                Body=json.dumps({csa_pointer_key_str: obj_key}).encode("utf-8"),
+                ContentType="application/json",
+                **get_put_object_args(bucket_name, pointer_key),
+                **({"IfMatch": etag} if etag else {"IfNoneMatch": "*"}),
             )
-            logger.info(f"## S3 Put Object response: {s3_res['put_object']}")
+            logger.info(f"## S3 Put Object response: {s3_res}")
+            return {csa_pointer_str: s3_res}
         except ClientError as ex:
-            logger.error(f"## ERROR: {ex}")
-            return status_failed(s3_res)
+            if ex.response["Error"]["Code"] not in {"PreconditionFailed", "ConditionalRequestConflict"}:
+                logger.error(f"## ERROR: {ex}")
+                return status_failed({})
+            logger.info(f"## Retrying (The latest CSA pointer was updated concurrently): '{pointer_key}'")
+    logger.error(
+        f"## Could NOT update the latest CSA pointer (after {csa_pointer_max_attempts} attempts): '{pointer_key}'"
+    )
+    return status_failed({})
+
 
+# Record the outputs of the completed run (of the source, CSA timestamp and sih-lion version) in its completion marker
+# object, so a retried (or re-driven) run returns the recorded outputs, rather than processing the CSA timestamp again.
+def set_completion_marker(s3, csa_timestamp: str, s3_res: dict) -> None:
+    bucket_name = os.environ[S3_SAT_DATA_BUCKET_NAME]
+    marker_key = get_completion_marker_key(csa_timestamp)
+    logger.info(f"## Creating the completion marker: s3://{bucket_name}/{marker_key}")
     try:
-        s3_res["put_object_tagging"] = s3.put_object_tagging(
-            Bucket=bucket_name,
-            Key=prefix_path,
-            ChecksumAlgorithm=os.environ[CHECKSUM_ALGORITHM],
-            Tagging={"TagSet": json.loads(os.environ[TAGS])},
-            ExpectedBucketOwner=os.environ[ACCOUNT_OWNER_ID],
+        s3_res_marker = s3.put_object(
+            Body=json.dumps(
+                {
+                    "source_name": os.environ[SOURCE_NAME],
+                    csa_timestamp_str: csa_timestamp,
+                    "sih_lion_version": sih_lion_version,
+                    responses_str: s3_res,
+                },
+                default=str,
+            ).encode("utf-8"),
+            ContentType="application/json",
+            **get_put_object_args(bucket_name, marker_key),
         )
-        logger.info(f"## S3 Put Object Tagging response: {s3_res['put_object_tagging']}")
+        logger.info(f"## S3 Put Object response: {s3_res_marker}")
     except ClientError as ex:
+        # The outputs are published, so without a completion marker a retried run only processes them again.
         logger.error(f"## ERROR: {ex}")
-        return status_failed(s3_res)
 
-    return s3_res
+
+# Stage all the inputs concurrently, each by a staging job (which returns the local file path of the input, or None),
+# and report the staging time of each input.
+def stage_inputs(staging_jobs: dict[tuple[str, ...], partial], max_workers: int) -> dict[tuple[str, ...], str]:
+    logger.info(f"## Staging inputs (count: {len(staging_jobs)}, max workers: {max_workers})")
+    start = time.perf_counter()
+    staged_inputs: dict[tuple[str, ...], str] = {}
+    staging_times: dict[tuple[str, ...], float] = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(run_timed, staging_job): k for k, staging_job in staging_jobs.items()}
+        for future in as_completed(futures):
+            staged_inputs[futures[future]], staging_times[futures[future]] = future.result()
+    for k, staging_time in sorted(staging_times.items(), key=lambda i: i[1], reverse=True):
+        logger.info(f"## Staged input '{'/'.join(k)}' in {staging_time:.3f}s: {staged_inputs[k]}")
+    logger.info(f"## Staged inputs (count: {len(staging_jobs)}) in {time.perf_counter() - start:.3f}s")
+    return staged_inputs
 
 
 def status_failed(responses: dict) -> dict:
     return {status_str: "FAILED", responses_str: responses}
 
 
+# Stitch the outputs of the row bands (in row order) back together, into the temporary folder path: the CSA files are
+# concatenated along their first (row) axis, and the param data files along their row dimension.
+def stitch_row_bands(band_source_data: list[tuple[str, dict]]) -> dict:
+    source_data = dict(band_source_data[0][1])
+    if any(res != source_data for _, res in band_source_data):
+        raise RuntimeError(f"## The row bands have different outputs: {[res for _, res in band_source_data]}")
+    if (csa_filename := source_data.get("csa")) is not None:
+        with open(os.path.join(os.environ[TMP_FOP], csa_filename), "wb") as f:
+            np.save(f, np.concatenate([np.load(os.path.join(i, csa_filename)) for i, _ in band_source_data], axis=0))
+    for atmos_param_filename in source_data.get("params") or []:
+        xr.concat(
+            [xr.load_dataset(os.path.join(i, atmos_param_filename)) for i, _ in band_source_data],
+            dim=os.getenv(TILE_ROW_DIM, tile_row_dim_default),
+            # Only the variables (and coords) along the row dim are concatenated, the rest are taken from the first band.
+            data_vars="minimal",
+            coords="minimal",
+            compat="override",
+        ).to_netcdf(os.path.join(os.environ[TMP_FOP], atmos_param_filename))
+    logger.info(f"## Stitched row bands (count: {len(band_source_data)}): {source_data}")
+    return source_data
+
+
 def valid_timestamp(i, latest_start_time_old: str) -> int:
     obj_key = i["Key"]
     logger.debug(f"## Checking for valid timestamp: '{obj_key}' (old latest start time: '{latest_start_time_old}')")
@@ -163,13 +762,14 @@ def valid_timestamp(i, latest_start_time_old: str) -> int:
     return timestamp if timestamp > int(latest_start_time_old) else None
 
 
-def clear_tmp_directory(tmp_fop: str):
+def clear_tmp_directory(tmp_fop: str, keep: set[str] = None):
     # pylint: disable=expression-not-assigned
     tmp_directory = Path(tmp_fop)
+    keep = {Path(i) for i in keep} if keep else set()
     # Remove all files
-    [fp.unlink() for fp in tmp_directory.glob("*") if fp.is_file() or fp.is_symlink()]
+    [fp.unlink() for fp in tmp_directory.glob("*") if (fp.is_file() or fp.is_symlink()) and fp not in keep]
     # Remove all directories
-    [shutil.rmtree(dp) for dp in tmp_directory.glob("*") if dp.is_dir()]
+    [shutil.rmtree(dp) for dp in tmp_directory.glob("*") if dp.is_dir() and dp not in keep]
 
 
 def lambda_handler(event, context):
@@ -197,6 +797,13 @@ def lambda_handler(event, context):
         logger.error(f"## One or more of {env_keys} is not set in ENVIRONMENT VARIABLES: {os.environ}")
         sys.exit(1)
 
+    static_grid_input_mode = os.getenv(STATIC_GRID_INPUT_MODE, static_grid_input_mode_default)
+    if static_grid_input_mode not in static_grid_input_modes:
+        logger.error(
+            f"## The static grid input mode '{static_grid_input_mode}' is not one of: {static_grid_input_modes}"
+        )
+        sys.exit(1)
+
     logger.info(f"## EVENT: {event}")
 
     os.environ[TMP_FOP] = tempfile.gettempdir()
@@ -206,32 +813,26 @@ def lambda_handler(event, context):
         os.environ[k] = json.dumps(v)
         logger.info(f"Set env var {k}: {os.environ[k]}")
 
-    s3 = boto3.client("s3", region_name=os.environ["AWS_REGION"])
-    logger.info("## Connected to S3 via client")
-
-    process_input = {
-        **get_sat_data(s3, dict(event[os.environ[EVENT_META_KEY]]["data_service_files"])),
-        **{
-            static_grids_str: {
-                i: s3_download_fileobj(
-                    s3,
-                    bucket_name=os.environ[PYPI_PACKAGE_S3_BUCKET_NAME],
-                    obj_key=[
-                        obj["Key"]
-                        for obj in s3_list_objects(
-                            s3,
-                            os.environ[PYPI_PACKAGE_S3_BUCKET_NAME],
-                            f"{os.environ[PYPI_PACKAGE_S3_BUCKET_BRANCH]}/sih_lion/"
-                            f"{static_grids_str}/satellite/{os.environ[SOURCE_NAME]}/{i}",
-                        )["Contents"]
-                        if str(obj["Key"]).endswith(".npy")
-                    ][0],
-                )
-                for i in ["geolocation", "scan_time_offset", "vaa", "vza"]
-            },
-            csa_str: {},
-        },
-    }
+    max_workers = int(os.getenv(MAX_WORKERS, str(max_workers_default)))
+    static_grid_cache_enabled: bool = json.loads(os.getenv(STATIC_GRID_CACHE_ENABLED, "true").lower())
+    tile_bands = int(os.getenv(TILE_BANDS, str(tile_bands_default)))
+    transfer_config = get_transfer_config()
+    s3 = get_s3_client(max_workers, transfer_config.max_concurrency)
+
+    catch_up: bool = catch_up_str in event[os.environ[EVENT_META_KEY]]
+    # Short-circuit a retried (or re-driven) run of an already completed CSA timestamp, before staging any inputs.
+    idempotency_enabled: bool = json.loads(os.getenv(IDEMPOTENCY_ENABLED, "true").lower())
+    csa_timestamp = event[os.environ[EVENT_META_KEY]].get(csa_timestamp_str)
+    if catch_up:
+        logger.info(f"## Catching up on CSA timestamps (count: {len(event[os.environ[EVENT_META_KEY]][catch_up_str])})")
+    elif idempotency_enabled and csa_timestamp is None:
+        logger.info(f"## No '{csa_timestamp_str}' in the event, cannot short-circuit a completed run")
+    elif idempotency_enabled and (completion_marker := get_completion_marker(s3, csa_timestamp)) is not None:
+        logger.info(
+            f"## Skipping (Already completed for CSA timestamp: '{csa_timestamp}', "
+            f"sih-lion version: '{sih_lion_version}'), returning the recorded outputs"
+        )
+        return {status_str: "SUCCEEDED", responses_str: completion_marker[responses_str]}
 
     today = datetime_date.today()
     dt_yesterday = (today - timedelta(days=1)).isoformat()
@@ -239,30 +840,6 @@ def lambda_handler(event, context):
     dt_meta = {today_str: dt_today, yesterday_str: dt_yesterday}
     logger.info(f"## Date Meta: '{dt_meta}'")
 
-    for key, date in dt_meta.items():
-        bucket_name = os.environ[S3_SAT_DATA_BUCKET_NAME]
-        prefix_path = f"{csa_str}/{os.environ[DEPLOY_ENV]}/{os.environ[SOURCE_NAME]}/{date}"
-        s3_res_list = []
-        csa_files = set()
-        is_truncated = True
-        next_continuation_token = None
-        while is_truncated:
-            s3_res = s3_list_objects(s3, bucket_name, prefix_path, continuation_token=next_continuation_token)
-            s3_res_list.append(s3_res)
-            is_truncated = s3_res["IsTruncated"]
-            if "Contents" in s3_res:
-                csa_files = csa_files.union({i["Key"].rsplit(sep="/", maxsplit=1)[-1] for i in s3_res["Contents"]})
-            if is_truncated and "NextContinuationToken" in s3_res:
-                next_continuation_token = s3_res["NextContinuationToken"]
-        process_input[csa_str][key] = (
-            s3_download_fileobj(s3, bucket_name=bucket_name, obj_key=f"{prefix_path}/{csa_files_list[0]}")
-            if (csa_files_list := sorted(list(csa_files), reverse=True))
-            else None
-        )
-        logger.info(f"## Found CSA file (for {key}): {process_input[csa_str][key]}")
-
-    logger.info(f"## Process Input: '{process_input}'")
-
     # Create source config.
     _config = SourceConfig()
 
@@ -271,46 +848,81 @@ def lambda_handler(event, context):
         logger.error(f"## No processor created: {_config.CLASS}")
         raise RuntimeError(f"## No processor created: {_config.CLASS}")
 
-    source_data = None
-    try:
-        source_data = processor.get_data(**process_input)
-    except OSError as ex:
-        logger.info(f"## Could not get processor source data: {ex}")
-        traceback.print_exc()  # Prints the traceback for debugging
-
-    if (csa_filename := source_data.get("csa")) is None:
-        logger.error("## No CSA file found.")
-        return {status_str: "FAILED"}
-
-    s3_res = {param_data_str: {}}
-    s3_put_object_failed = False
-
-    # Write new CSA file to S3
-    s3_res[csa_str] = s3_put_object(
+    process_timestamp_ = partial(
+        process_timestamp,
         s3,
-        os.environ[S3_SAT_DATA_BUCKET_NAME],
-        f"{csa_str}/{os.environ[DEPLOY_ENV]}/{processor.name}/{dt_today}/{csa_filename}",
-        os.path.join(os.environ[TMP_FOP], csa_filename),
+        processor,
+        dt_meta,
+        transfer_config=transfer_config,
+        max_workers=max_workers,
+        tile_bands=tile_bands,
+        static_grid_input_mode=static_grid_input_mode,
+        static_grid_cache_enabled=static_grid_cache_enabled,
     )
-    if status_str in s3_res[csa_str]:
-        s3_put_object_failed = True
+    # The staged inputs (kept between the CSA timestamps of a catch up), of the staging job keys to local file paths.
+    staged_inputs: dict[tuple[str, ...], str] = {}
 
-    # Write new param data file(s) to S3
-    if (atmos_param_filenames := source_data.get("params")) is not None:
-        for atmos_param_filename in atmos_param_filenames:
-            s3_res[param_data_str][atmos_param_filename] = s3_put_object(
-                s3,
-                os.environ[S3_PARAM_DATA_BUCKET_NAME],
-                f"{os.environ[S3_PARAM_DATA_BUCKET_OBJ_PREFIX]}/{atmos_param_filename}",
-                os.path.join(os.environ[TMP_FOP], atmos_param_filename),
+    if not catch_up:
+        s3_res, s3_put_object_failed, csa_filename = process_timestamp_(
+            dict(event[os.environ[EVENT_META_KEY]]["data_service_files"]), staged_inputs
+        )
+        if csa_filename is None:
+            return {status_str: "FAILED"}
+
+        if idempotency_enabled and csa_timestamp is not None and not s3_put_object_failed:
+            set_completion_marker(s3, csa_timestamp, s3_res)
+
+        clear_run(static_grid_cache_enabled)
+
+        return {status_str: "FAILED" if s3_put_object_failed else "SUCCEEDED", responses_str: s3_res}
+
+    # Catch up on the CSA timestamps (oldest first), while the invocation time budget allows, loading the static grids
+    # once and chaining the new CSA file of each CSA timestamp as the (today) CSA file input of the next.
+    metas: list[dict] = list(event[os.environ[EVENT_META_KEY]][catch_up_str])
+    time_reserve_millis = int(os.getenv(TIME_RESERVE_MILLIS, str(time_reserve_millis_default)))
+    responses: dict[str, dict] = {}
+    status = "SUCCEEDED"
+    timestamp_millis: int = 0
+    while metas:
+        csa_timestamp = metas[0][csa_timestamp_str]
+        if (
+            responses
+            and hasattr(context, "get_remaining_time_in_millis")
+            and (remaining_millis := context.get_remaining_time_in_millis()) < time_reserve_millis + timestamp_millis
+        ):
+            logger.info(
+                f"## Stopping catch up (CSA timestamp: '{csa_timestamp}', remaining: {len(metas)}), "
+                f"not enough invocation time left: {remaining_millis}ms"
             )
-            if status_str in s3_res[param_data_str][atmos_param_filename]:
-                s3_put_object_failed = True
-    else:
-        logger.info("## No param data files found.")
-
-    logger.info(f"## Clear the temporary folder path: {os.environ[TMP_FOP]}")
-    clear_tmp_directory(os.environ[TMP_FOP])
-    logger.info("## Temporary folder path cleared")
-
-    return {status_str: "FAILED" if s3_put_object_failed else "SUCCEEDED", responses_str: s3_res}
+            break
+        if idempotency_enabled and (completion_marker := get_completion_marker(s3, csa_timestamp)) is not None:
+            logger.info(f"## Skipping (Already completed for CSA timestamp: '{csa_timestamp}')")
+            responses[csa_timestamp] = completion_marker[responses_str]
+            metas.pop(0)
+            # The new CSA file of the completed run is not chained, so stage the latest CSA files again.
+            drop_csa_inputs(staged_inputs, list(dt_meta))
+            continue
+        timestamp_start = time.monotonic()
+        s3_res, s3_put_object_failed, csa_filename = process_timestamp_(
+            dict(metas[0]["data_service_files"]), staged_inputs
+        )
+        responses[csa_timestamp] = s3_res
+        if csa_filename is None or s3_put_object_failed:
+            logger.error(f"## Stopping catch up, failed for CSA timestamp: '{csa_timestamp}'")
+            status = "FAILED"
+            break
+        if idempotency_enabled:
+            set_completion_marker(s3, csa_timestamp, s3_res)
+        metas.pop(0)
+        chain_csa(staged_inputs, csa_filename, list(s3_res[param_data_str]))
+        timestamp_millis = max(timestamp_millis, int((time.monotonic() - timestamp_start) * 1000))
+        logger.info(f"## Caught up on CSA timestamp: '{csa_timestamp}' (remaining: {len(metas)})")
+
+    clear_run(static_grid_cache_enabled)
+
+    return {
+        status_str: status,
+        responses_str: responses,
+        # The CSA timestamps not (yet) caught up on, e.g. to catch up on in the next execution.
+        os.environ[EVENT_META_KEY]: {catch_up_str: metas},
+    }
@@ -1,5 +1,8 @@
 import json
 import os
+import tempfile
+import time
+from datetime import date, datetime, timedelta
 from pprint import pprint
 
 import amplify.AmplifyMsTeamsNotification.lambda_function as amplify_ms_teams
@@ -128,9 +131,137 @@ def run_lion_processor_poll_lion_global():
     os.environ["SAT_DATA_SERVICES"] = json.dumps(
         {"rad": {"folder": "ABI-L1b-RadF", "filter": "M6C02"}, "clm": {"folder": "ABI-L2-ACMF", "filter": None}}
     )
+    # os.environ["MAX_WORKERS"] = "32"  # Optional
+    # os.environ["DEST_KEY_INDEX_CACHE_ENABLED"] = "true"  # Optional
+    # os.environ["WATERMARK_PARAMETER"] = "/LionPoll/goes16/watermarks"  # Optional
+    # os.environ["MAX_CATCH_UP_HOURS"] = "24"  # Optional
+    # os.environ["TIME_RESERVE_MILLIS"] = "30000"  # Optional
+    # os.environ["TIMESTAMP_INDEX_ENABLED"] = "false"  # Optional
+    # os.environ["TIMESTAMP_INDEX_RETENTION_DAYS"] = "7"  # Optional
     pprint(processor_poll_lion_global.lambda_handler({}, {}))
 
 
+def run_lion_processor_poll_lion_global_notifications(obj_keys: list[str]):
+    os.environ["ACCOUNT_OWNER_ID"] = "123456789123"
+    os.environ["BUCKET_NAME_SOURCE"] = "noaa-goes16"
+    os.environ["BUCKET_NAME_DEST"] = "lion-sat-data"
+    os.environ["SAT_DATA_ORG"] = "eumetsat-public"
+    os.environ["SOURCE_NAME"] = "goes16"
+    os.environ["SAT_DATA_SERVICES"] = json.dumps(
+        {"rad": {"folder": "ABI-L1b-RadF", "filter": "M6C02"}, "clm": {"folder": "ABI-L2-ACMF", "filter": None}}
+    )
+    # Local stand-in for an SQS batch, of SNS notifications, of S3 object created events (one message per S3 object).
+    event_obj = {
+        "Records": [
+            {
+                "messageId": f"local-{i}",
+                "eventSource": "aws:sqs",
+                "body": json.dumps(
+                    {
+                        "Type": "Notification",
+                        "Message": json.dumps(
+                            {
+                                "Records": [
+                                    {
+                                        "eventName": "ObjectCreated:Put",
+                                        "s3": {
+                                            "bucket": {"name": os.environ["BUCKET_NAME_SOURCE"]},
+                                            "object": {"key": obj_key, "size": 0},
+                                        },
+                                    }
+                                ]
+                            }
+                        ),
+                    }
+                ),
+            }
+            for i, obj_key in enumerate(obj_keys)
+        ]
+    }
+    pprint(processor_poll_lion_global.notification_handler(event_obj, {}))
+
+
+def run_lion_processor_latest_lion_global_start_timestamp_benchmark(num_keys: int = 100000):
+    # Imported here, as the Lambda function needs the sih-lion package, which the other runners do not.
+    # pylint: disable=import-outside-toplevel
+    import lion.processor.ProcessorLatestLionGlobal.lambda_function as processor_latest_lion_global
+
+    os.environ["SOURCE_NAME"] = "goes16"
+    # os.environ["FILENAMES_INFO"] = ""  # Required by the FileMetaReaderSettings, if not set already
+    start_dt = datetime(2023, 5, 10)
+    obj_keys = [
+        f"eumetsat-public/goes16/rad/OR_ABI-L1b-RadF-M6C02_G16_s{dt.strftime('%Y%j%H%M')}205_e"
+        f"{dt.strftime('%Y%j%H%M')}513_c{dt.strftime('%Y%j%H%M')}563.nc"
+        for dt in (start_dt + timedelta(minutes=10 * i) for i in range(num_keys))
+    ]
+    processor_latest_lion_global.get_start_timestamp.cache_clear()
+    for name, get_start_timestamp in [
+        ("FileMetaReader", processor_latest_lion_global.get_start_timestamp_reader),
+        ("Fast path (cold)", processor_latest_lion_global.get_start_timestamp),
+        ("Fast path (warm)", processor_latest_lion_global.get_start_timestamp),
+    ]:
+        start = time.perf_counter()
+        for obj_key in obj_keys:
+            get_start_timestamp(os.environ["SOURCE_NAME"], "rad", obj_key)
+        print(f"{name}: {num_keys / (time.perf_counter() - start):,.0f} keys/sec")
+
+
+def run_lion_processor_process_lion_global_tile_benchmark(data_service_files: dict, tile_bands: int = 4):
+    # Imported here, as the Lambda function (and the output checks) need sih-lion, numpy and xarray, unlike the others.
+    # pylint: disable=import-outside-toplevel
+    import numpy as np
+    import xarray as xr
+
+    import lion.processor.ProcessorProcessLionGlobal.lambda_function as processor_process_lion_global
+
+    os.environ["AWS_REGION"] = "eu-west-2"
+    os.environ["ACCOUNT_OWNER_ID"] = "123456789123"
+    os.environ["S3_SAT_DATA_BUCKET_NAME"] = "lion-sat-data"
+    os.environ["PYPI_PACKAGE_S3_BUCKET_NAME"] = "sihlion-pypi"
+    os.environ["PYPI_PACKAGE_S3_BUCKET_BRANCH"] = "main"
+    os.environ["DEPLOY_ENV"] = "staging"
+    os.environ["SOURCE_NAME"] = "goes16"
+    # os.environ["SOURCE_SYSTEM_OBJS"] = ""  # Required by the SourceConfig, if not set already
+    # os.environ["TILE_ROW_DIM"] = "y"  # Optional
+    process = processor_process_lion_global
+    os.environ[process.TMP_FOP] = tempfile.mkdtemp()
+    for k, v in json.loads(os.getenv("SOURCE_SYSTEM_OBJS", "{}")).items():
+        os.environ[k] = json.dumps(v)
+    today = date.today()
+    dt_meta = {process.today_str: today.isoformat(), process.yesterday_str: (today - timedelta(days=1)).isoformat()}
+    transfer_config = process.get_transfer_config()
+    s3 = process.get_s3_client(process.max_workers_default, transfer_config.max_concurrency)
+    staging_jobs = process.get_staging_jobs(s3, data_service_files, dt_meta, transfer_config)
+    staged_inputs = process.stage_inputs(staging_jobs, process.max_workers_default)
+    process_input = process.get_process_input(data_service_files, dt_meta, staged_inputs)
+    processor = process.Processor.from_config(process.SourceConfig(), process.logger)
+    outputs = {}
+    for n in [1, tile_bands]:
+        start = time.perf_counter()
+        source_data = process.get_source_data(processor, process_input, n)
+        print(f"Row bands: {n}: {time.perf_counter() - start:.3f}s")
+        outputs[n] = {
+            filename: (np.load if filename.endswith(".npy") else xr.load_dataset)(
+                os.path.join(os.environ[process.TMP_FOP], filename)
+            )
+            for filename in [source_data["csa"], *(source_data.get("params") or [])]
+        }
+    # Bit-identical: the same dtype, shape and bytes, of the CSA array, and of every variable of each param dataset.
+    for filename, single in outputs[1].items():
+        tiled = outputs[tile_bands][filename]
+        if isinstance(single, np.ndarray):
+            arrays = [(single, tiled)]
+        elif sorted(single.variables) == sorted(tiled.variables):
+            arrays = [(single[k].values, tiled[k].values) for k in single.variables]
+        else:
+            arrays = None
+        identical = arrays is not None and all(
+            a.dtype == b.dtype and a.shape == b.shape and a.tobytes() == b.tobytes() for a, b in arrays
+        )
+        print(f"{filename}: {'bit-identical' if identical else 'DIFFERENT'}")
+    process.clear_tmp_directory(os.environ[process.TMP_FOP])
+
+
 def run_lion_processor_archive_lion_global():
     os.environ["ACCOUNT_OWNER_ID"] = "123456789123"
     os.environ["BUCKET_NAME_DEST"] = "lion-sat-data"
@@ -398,6 +529,13 @@ def main():
     # run_ec2_instance_auto_stop()
     # run_lion_extractor_layer_lion_ms()
     # run_lion_processor_poll_lion_global()
+    # run_lion_processor_poll_lion_global_notifications(
+    #     ["ABI-L1b-RadF/2023/130/12/OR_ABI-L1b-RadF-M6C02_G16_s20231301200205_e20231301209513_c20231301209563.nc"]
+    # )
+    # run_lion_processor_latest_lion_global_start_timestamp_benchmark()
+    # run_lion_processor_process_lion_global_tile_benchmark(
+    #     {"rad": ["lion-sat-data/eumetsat-public/goes16/rad/OR_ABI-L1b-RadF-M6C02_G16_s20231300000205_e..."]}
+    # )
     # run_lion_processor_archive_lion_global()
     # run_elasticache_redis_auto_start()
     # run_elasticache_redis_auto_stop()